@@ -0,0 +1,10 @@
+-- One bot_positions row per bot and symbol (upserted by the position checkpointer)
+-- Keep the most recent row when duplicates exist
+DELETE FROM bot_positions a
+USING bot_positions b
+WHERE a.bot_id = b.bot_id
+  AND a.symbol = b.symbol
+  AND a.id < b.id;
+
+ALTER TABLE bot_positions
+ADD CONSTRAINT uq_bot_positions_bot_symbol UNIQUE (bot_id, symbol);
@@ -2,11 +2,13 @@ from typing import Any, List
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_
-import ccxt
 
 from app import models, schemas
 from app.api import deps
 from app.db.session import get_db
+from app.services.bot_manager import bot_manager
+from app.trading.exchange_pool import exchange_pool
+from app.trading.markets import market_metadata
 from app.schemas.api_key import (
     ApiKeyCreate, 
     ApiKeyUpdate, 
@@ -17,6 +19,8 @@ from app.schemas.api_key import (
 
 router = APIRouter()
 
+SUPPORTED_EXCHANGES = ("bitget", "binance")
+
 
 @router.post("/", response_model=ApiKeyResponse)
 async def create_api_key(
@@ -142,6 +146,8 @@ async def update_api_key(
     
     await db.commit()
     await db.refresh(api_key)
+    # Cached balance and leverage belonged to the old credentials
+    bot_manager.forget_api_key(api_key)
     
     return ApiKeyResponse(**api_key.to_dict_safe())
 
@@ -189,6 +195,7 @@ async def delete_api_key(
     
     await db.delete(api_key)
     await db.commit()
+    bot_manager.forget_api_key(api_key)
     
     return {"message": "API key deleted successfully"}
 
@@ -218,34 +225,24 @@ async def test_api_key(
         )
     
     try:
-        # Get decrypted credentials
-        credentials = api_key.get_credentials()
-        
-        # Create exchange instance
-        exchange_config = {
-            'apiKey': credentials['api_key'],
-            'secret': credentials['secret'],
-            'sandbox': api_key.is_sandbox,
-            'enableRateLimit': True,
-        }
-        
-        # Add passphrase if provided (for exchanges like OKX, Bitget)
-        if credentials.get('passphrase'):
-            exchange_config['password'] = credentials['passphrase']
-        
-        # Initialize exchange
-        if api_key.exchange == 'bitget':
-            exchange = ccxt.bitget(exchange_config)
-        elif api_key.exchange == 'binance':
-            exchange = ccxt.binance(exchange_config)
-        else:
+        if api_key.exchange not in SUPPORTED_EXCHANGES:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Exchange {api_key.exchange} not supported"
             )
         
-        # Test connection by fetching balance
-        balance = await exchange.fetch_balance()
+        # Get decrypted credentials
+        credentials = api_key.get_credentials()
+        credentials['sandbox'] = api_key.is_sandbox
+        
+        # Reuse shared markets instead of a cold load_markets per client
+        await market_metadata.load(api_key.exchange, api_key.is_sandbox)
+        
+        # Test connection by fetching balance on a pooled client
+        tier = await deps.get_user_subscription_tier(db, current_user)
+        calls_per_minute = tier.api_calls_per_minute if tier else None
+        async with exchange_pool.client(api_key.exchange, credentials, calls_per_minute) as exchange:
+            balance = await exchange.fetch_balance()
         
         # Mark as verified
         api_key.mark_verified()
@@ -303,32 +300,23 @@ async def get_account_balance(
         )
     
     try:
-        # Get decrypted credentials
-        credentials = api_key.get_credentials()
-        
-        # Create exchange instance (same logic as test)
-        exchange_config = {
-            'apiKey': credentials['api_key'],
-            'secret': credentials['secret'],
-            'sandbox': api_key.is_sandbox,
-            'enableRateLimit': True,
-        }
-        
-        if credentials.get('passphrase'):
-            exchange_config['password'] = credentials['passphrase']
-        
-        if api_key.exchange == 'bitget':
-            exchange = ccxt.bitget(exchange_config)
-        elif api_key.exchange == 'binance':
-            exchange = ccxt.binance(exchange_config)
-        else:
+        if api_key.exchange not in SUPPORTED_EXCHANGES:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Exchange {api_key.exchange} not supported"
             )
         
-        # Fetch balance
-        balance = await exchange.fetch_balance()
+        # Get decrypted credentials
+        credentials = api_key.get_credentials()
+        credentials['sandbox'] = api_key.is_sandbox
+        
+        await market_metadata.load(api_key.exchange, api_key.is_sandbox)
+        
+        # Fetch balance (same pooled client as the test endpoint and bots)
+        tier = await deps.get_user_subscription_tier(db, current_user)
+        calls_per_minute = tier.api_calls_per_minute if tier else None
+        async with exchange_pool.client(api_key.exchange, credentials, calls_per_minute) as exchange:
+            balance = await exchange.fetch_balance()
         
         return {
             "exchange": api_key.exchange,
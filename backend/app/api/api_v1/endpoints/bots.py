@@ -1,4 +1,6 @@
 from typing import List, Any
+import asyncio
+from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
@@ -6,8 +8,11 @@ from sqlalchemy import select
 from app import models, schemas
 from app.api import deps
 from app.db.session import get_db
-from app.core.websocket import websocket_manager
+from app.core.websocket import BOT_CREATED, BOT_DELETED, BOT_UPDATED, websocket_manager
 from app.services.bot_manager import bot_manager
+from app.services.bot_supervisor import bot_supervisor
+from app.trading.backtest import BacktestParams, load_ohlcv, run_backtest
+from app.trading.markets import market_metadata
 
 router = APIRouter()
 
@@ -74,7 +79,7 @@ async def create_bot(
     await websocket_manager.broadcast_bot_update(
         str(current_user.id),
         str(bot.uuid),
-        "created",
+        BOT_CREATED,
         {"name": bot.name, "status": bot.status}
     )
     
@@ -115,7 +120,7 @@ async def start_bot(
     """
     Start trading bot.
     """
-    bot = await deps.get_bot_by_uuid(db, bot_id)
+    bot = await deps.get_bot_by_uuid(db, bot_id, load_config=True)
     if not bot:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -133,8 +138,14 @@ async def start_bot(
             detail="Bot is already running"
         )
     
-    # Start bot using bot manager
-    success = await bot_manager.start_bot(db, bot)
+    if await bot_supervisor.owner(str(bot.uuid)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Bot is already running"
+        )
+    
+    # Start bot on this worker (leased so no other worker starts it too)
+    success = await bot_supervisor.start_bot(db, bot)
     
     if not success:
         raise HTTPException(
@@ -173,8 +184,8 @@ async def stop_bot(
             detail="Bot is not running"
         )
     
-    # Stop bot using bot manager
-    success = await bot_manager.stop_bot(db, bot)
+    # Stop bot wherever it runs
+    success = await bot_supervisor.stop_bot(db, bot)
     
     if not success:
         raise HTTPException(
@@ -228,7 +239,7 @@ async def update_bot(
     await websocket_manager.broadcast_bot_update(
         str(current_user.id),
         str(bot.uuid),
-        "updated",
+        BOT_UPDATED,
         {"name": bot.name, "status": bot.status.value}
     )
     
@@ -266,7 +277,7 @@ async def delete_bot(
     
     # Stop bot if it's running in manager (safety check)
     if bot_manager.is_bot_running(str(bot.uuid)):
-        await bot_manager.stop_bot(db, bot)
+        await bot_supervisor.stop_bot(db, bot)
     
     # Delete bot (cascade will delete config and positions)
     await db.delete(bot)
@@ -276,7 +287,7 @@ async def delete_bot(
     await websocket_manager.broadcast_bot_update(
         str(current_user.id),
         str(bot.uuid),
-        "deleted",
+        BOT_DELETED,
         {"message": "Bot deleted successfully"}
     )
     
@@ -305,8 +316,9 @@ async def get_bot_status(
             detail="Not enough permissions"
         )
     
-    # Get running bot instance if available
+    # Get running bot instance if available (only on the worker running it)
     running_bot = bot_manager.get_running_bot(str(bot.uuid))
+    worker_id = await bot_supervisor.owner(str(bot.uuid))
     
     status_info = {
         "bot_id": str(bot.uuid),
@@ -316,6 +328,7 @@ async def get_bot_status(
         "exchange": bot.exchange,
         "symbols": bot.symbols,
         "is_running_in_manager": running_bot is not None,
+        "worker_id": worker_id,
         "created_at": bot.created_at.isoformat() if bot.created_at else None,
         "updated_at": bot.updated_at.isoformat() if bot.updated_at else None,
     }
@@ -324,8 +337,75 @@ async def get_bot_status(
     if running_bot:
         status_info["runtime_info"] = {
             "exchange_connected": running_bot.exchange is not None,
-            "trading_state": running_bot.trades,
+            "trading_state": running_bot.snapshot(),
             "is_running": running_bot.is_running,
         }
     
-    return status_info
\ No newline at end of file
+    return status_info
+
+
+@router.post("/{bot_id}/backtest", response_model=schemas.BacktestResponse)
+async def backtest_bot(
+    *,
+    db: AsyncSession = Depends(get_db),
+    bot_id: str,
+    backtest_in: schemas.BacktestRequest,
+    current_user: models.User = Depends(deps.get_current_user),
+) -> Any:
+    """
+    Backtest bot configuration over historical OHLCV data.
+    """
+    bot = await deps.get_bot_by_uuid(db, bot_id, load_config=True)
+    if not bot:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Bot not found"
+        )
+    if bot.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    if not await deps.user_can_backtest(db, current_user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Backtesting is not included in your subscription"
+        )
+    
+    symbol = backtest_in.symbol or bot.symbols[0]
+    since = int((datetime.utcnow() - timedelta(days=backtest_in.days)).timestamp() * 1000)
+    
+    try:
+        ohlcv = await load_ohlcv(bot.exchange, symbol, backtest_in.timeframe, since)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Failed to load market history: {str(e)}"
+        )
+    
+    if ohlcv.empty:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"No market history available for {symbol}"
+        )
+    
+    params = BacktestParams.from_config(
+        bot.config,
+        fee_rate=backtest_in.fee_rate,
+        initial_balance=backtest_in.initial_balance
+    )
+    
+    # Size orders to the market's amount step and minimums like the live bot
+    await market_metadata.load(bot.exchange)
+    market = market_metadata.get(bot.exchange, False, symbol)
+    
+    # Keep the CPU-bound replay off the event loop
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(None, run_backtest, ohlcv, params, None, market)
+    
+    return schemas.BacktestResponse(
+        symbol=symbol,
+        timeframe=backtest_in.timeframe,
+        **result.to_dict()
+    )
\ No newline at end of file
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, status
 from jose import jwt, JWTError
 from app.core.config import settings
-from app.core.websocket import websocket_manager
+from app.core.websocket import websocket_manager, negotiate_encoding
 import asyncio
 
 router = APIRouter()
@@ -37,7 +37,9 @@ async def websocket_endpoint(websocket: WebSocket):
     if not user_id:
         return
         
-    await websocket_manager.connect(websocket, user_id)
+    # JSON text frames by default; clients may negotiate compact msgpack binary frames
+    encoding, subprotocol = negotiate_encoding(websocket)
+    await websocket_manager.connect(websocket, user_id, encoding, subprotocol)
     
     try:
         # Send initial connection message
@@ -46,12 +48,21 @@ async def websocket_endpoint(websocket: WebSocket):
             user_id
         )
         
-        # Keep connection alive
+        # Keep connection alive and apply subscribe/unsubscribe commands
         while True:
-            # Wait for any message from client (ping/pong)
-            data = await websocket.receive_text()
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            data = message.get("text")
+            if data is None:
+                data = message.get("bytes")
             if data == "ping":
-                await websocket.send_text("pong")
+                # Through the connection's writer so it never races queued updates
+                websocket_manager.send_to(websocket, "pong")
+            elif data:
+                websocket_manager.handle_command(websocket, data)
                 
     except WebSocketDisconnect:
+        pass
+    finally:
         websocket_manager.disconnect(websocket, user_id)
\ No newline at end of file
@@ -5,11 +5,13 @@ from jose import jwt, JWTError
 from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from sqlalchemy.orm import selectinload
 
 from app import models, schemas
 from app.core import security
 from app.core.config import settings
 from app.db.session import get_db
+from app.services.subscriptions import get_subscription_tier
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
@@ -97,8 +99,11 @@ async def create_user(db: AsyncSession, user_in: schemas.UserCreate) -> models.U
     return user
 
 
-async def get_bot_by_uuid(db: AsyncSession, bot_uuid: str) -> Optional[models.Bot]:
+async def get_bot_by_uuid(db: AsyncSession, bot_uuid: str, load_config: bool = False) -> Optional[models.Bot]:
     query = select(models.Bot).where(models.Bot.uuid == bot_uuid)
+    if load_config:
+        # Lazy loads are not possible on an AsyncSession
+        query = query.options(selectinload(models.Bot.config))
     result = await db.execute(query)
     return result.scalar_one_or_none()
 
@@ -108,4 +113,17 @@ def get_user_bot_limit(user: models.User) -> int:
     # TODO: Implement subscription logic
     if user.is_superuser:
         return 100
-    return settings.MAX_BOTS_FREE_TIER
\ No newline at end of file
+    return settings.MAX_BOTS_FREE_TIER
+
+
+async def get_user_subscription_tier(db: AsyncSession, user: models.User) -> Optional[models.SubscriptionTier]:
+    """Get the tier of the user's active subscription"""
+    return await get_subscription_tier(db, user.id)
+
+
+async def user_can_backtest(db: AsyncSession, user: models.User) -> bool:
+    """Check whether the user's subscription includes backtesting"""
+    if user.is_superuser:
+        return True
+    tier = await get_user_subscription_tier(db, user)
+    return bool(tier and tier.backtesting_enabled)
\ No newline at end of file
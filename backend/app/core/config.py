@@ -46,6 +46,54 @@ class Settings(BaseSettings):
     DEFAULT_LEVERAGE: int = 25
     DEFAULT_TAKE_PROFIT_PCT: float = 0.56
     
+    # Market Data
+    MARKET_DATA_MAX_AGE: float = 2.0  # seconds a shared ticker stays fresh
+    MARKET_DATA_REFRESH_INTERVAL: float = 1.0  # seconds between bulk ticker refreshes
+    PRICE_FEED_MODE: str = "poll"  # poll, stream (exchange WebSocket) or replay
+    PRICE_FEED_REPLAY_URL: str = "ws://localhost:8765"
+    BOT_POLL_INTERVAL: float = 5.0  # seconds between loop iterations without pushed ticks
+    ADAPTIVE_POLL_MIN: float = 0.5  # fastest check of a symbol next to a level
+    ADAPTIVE_POLL_MAX: float = 15.0  # slowest check of a quiet symbol
+    ADAPTIVE_POLL_SAFETY: float = 0.1  # fraction of the expected time to reach a level
+    ACCOUNT_BALANCE_TTL: float = 15.0  # seconds a shared account balance stays fresh
+    MARKET_METADATA_REFRESH_INTERVAL: float = 3600.0  # seconds between background market reloads
+    EXCHANGE_CLIENT_IDLE_TIMEOUT: float = 300.0  # seconds an unused pooled client stays open
+    
+    # Exchange Rate Limits (per API key)
+    RATE_LIMIT_DEFAULT_CALLS_PER_MINUTE: int = 60  # used when the user has no subscription tier
+    RATE_LIMIT_BURST_SECONDS: float = 5.0  # burst size, in seconds of budget
+    RATE_LIMIT_MAX_POLL_STRETCH: float = 6.0  # longest poll interval as a multiple of the base one
+    
+    # Bot Supervisor
+    BOT_LEASE_BACKEND: str = "memory"  # memory (single process), redis or postgres
+    BOT_LEASE_TTL: float = 30.0  # seconds a bot lease lasts without renewal
+    BOT_HEARTBEAT_INTERVAL: float = 10.0  # seconds between supervisor heartbeats
+    BOT_RESUME_CONCURRENCY: int = 8  # bots starting at the same time when resuming
+    BOT_RESUME_STAGGER: float = 0.25  # seconds between consecutive bot starts
+    BOT_STOP_TIMEOUT: float = 30.0  # seconds a stopping bot may take to finish its iteration
+    BOT_STOP_CHANNEL: str = "tradebuddy:bots:stopped"  # pub/sub channel telling owners a bot was stopped
+    
+    # Persistence
+    POSITION_CHECKPOINT_INTERVAL: float = 5.0  # seconds between write-behind position flushes
+    POSITION_CHECKPOINT_BATCH_SIZE: int = 1000  # most rows per upsert (asyncpg allows 32767 parameters)
+    TRADE_LEDGER_BATCH_SIZE: int = 500  # most fills per insert
+    TRADE_LEDGER_MAX_LATENCY: float = 1.0  # seconds a fill may wait for its batch to fill
+    TRADE_LEDGER_QUEUE_SIZE: int = 10000  # queued fills before bots wait for the writer
+    TRADE_LEDGER_MAX_RETRIES: int = 8  # retries of a failing batch before it is written row by row
+    
+    # WebSocket
+    WEBSOCKET_SEND_QUEUE_SIZE: int = 256  # messages buffered per client socket
+    WEBSOCKET_OVERFLOW_POLICY: str = "drop_oldest"  # drop_oldest or disconnect when a client falls behind
+    WEBSOCKET_COALESCE_WINDOW: float = 0.5  # seconds over which non-lifecycle bot updates are merged
+    WEBSOCKET_PUBSUB_BACKEND: str = "local"  # local (single worker), redis (REDIS_URL) or memory (tests)
+    WEBSOCKET_CHANNEL_PREFIX: str = "tradebuddy:ws:user:"
+    WEBSOCKET_PUBLISH_QUEUE_SIZE: int = 10000  # messages waiting to be published before the oldest ticks are dropped
+    
+    # Paper Trading
+    PAPER_INITIAL_BALANCE: float = 1000.0
+    PAPER_FEE_RATE: float = 0.0006  # taker fee charged on simulated fills
+    PAPER_SLIPPAGE_PCT: float = 0.02  # applied against the order side on every fill
+    
     # OAuth
     GOOGLE_CLIENT_ID: str = ""
     GOOGLE_CLIENT_SECRET: str = ""
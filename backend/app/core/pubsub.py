@@ -0,0 +1,137 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, List, Optional, Set, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PubSubBackend(ABC):
+    """Channel transport between API worker processes.
+
+    Each process holds one backend: it publishes to channels and receives
+    messages for the channels it subscribed to through a single listener.
+    """
+
+    async def publish(self, channel: str, payload: str):
+        await self.publish_many([(channel, payload)])
+
+    @abstractmethod
+    async def publish_many(self, messages: List[Tuple[str, str]]):
+        ...
+
+    @abstractmethod
+    async def subscribe(self, channel: str):
+        ...
+
+    @abstractmethod
+    async def unsubscribe(self, channel: str):
+        ...
+
+    @abstractmethod
+    def listen(self) -> AsyncIterator[Tuple[str, str]]:
+        """Yield (channel, payload) for subscribed channels until closed"""
+
+    async def close(self):
+        pass
+
+
+class InMemoryBroker:
+    """Stand-in for a Redis server shared by several InMemoryPubSub backends"""
+
+    def __init__(self):
+        self.backends: List["InMemoryPubSub"] = []
+
+    def deliver(self, channel: str, payload: str) -> int:
+        receivers = 0
+        for backend in self.backends:
+            if channel in backend.channels:
+                backend.inbox.put_nowait((channel, payload))
+                receivers += 1
+        return receivers
+
+
+class InMemoryPubSub(PubSubBackend):
+    """Process-local backend for tests; backends sharing a broker act as separate workers"""
+
+    def __init__(self, broker: Optional[InMemoryBroker] = None):
+        self.broker = broker or InMemoryBroker()
+        self.broker.backends.append(self)
+        self.channels: Set[str] = set()
+        self.inbox: asyncio.Queue = asyncio.Queue()
+
+    async def publish_many(self, messages: List[Tuple[str, str]]):
+        for channel, payload in messages:
+            self.broker.deliver(channel, payload)
+
+    async def subscribe(self, channel: str):
+        self.channels.add(channel)
+
+    async def unsubscribe(self, channel: str):
+        self.channels.discard(channel)
+
+    async def listen(self) -> AsyncIterator[Tuple[str, str]]:
+        while True:
+            yield await self.inbox.get()
+
+    async def close(self):
+        self.channels.clear()
+        if self in self.broker.backends:
+            self.broker.backends.remove(self)
+
+
+class RedisPubSub(PubSubBackend):
+    """Redis PUBLISH/SUBSCRIBE with one subscriber connection per process"""
+
+    def __init__(self, url: Optional[str] = None):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url or settings.REDIS_URL, decode_responses=True)
+        self.pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        self.channels: Set[str] = set()
+        self._subscribed = asyncio.Event()
+
+    async def publish_many(self, messages: List[Tuple[str, str]]):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for channel, payload in messages:
+                pipe.publish(channel, payload)
+            await pipe.execute()
+
+    async def subscribe(self, channel: str):
+        if channel not in self.channels:
+            self.channels.add(channel)
+            await self.pubsub.subscribe(channel)
+            self._subscribed.set()
+
+    async def unsubscribe(self, channel: str):
+        if channel in self.channels:
+            self.channels.discard(channel)
+            await self.pubsub.unsubscribe(channel)
+
+    async def listen(self) -> AsyncIterator[Tuple[str, str]]:
+        while True:
+            # get_message needs a subscription before it can read
+            if not self.pubsub.subscribed:
+                self._subscribed.clear()
+                await self._subscribed.wait()
+            message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if message and message.get('type') == 'message':
+                yield message['channel'], message['data']
+
+    async def close(self):
+        await self.pubsub.aclose()
+        await self.redis.aclose()
+
+
+def create_pubsub(backend: Optional[str] = None) -> Optional[PubSubBackend]:
+    """Transport for WEBSOCKET_PUBSUB_BACKEND: None for "local" (single worker), "redis" or "memory" """
+    backend = backend or settings.WEBSOCKET_PUBSUB_BACKEND
+    if backend == "redis":
+        return RedisPubSub()
+    if backend == "memory":
+        return InMemoryPubSub()
+    if backend != "local":
+        logger.warning(f"Unknown pub/sub backend {backend}, delivering locally")
+    return None
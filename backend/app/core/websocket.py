@@ -1,47 +1,582 @@
-from typing import Dict, Set
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
 from fastapi import WebSocket
 import json
 import asyncio
-from datetime import datetime
+import logging
+from collections import deque
+from datetime import datetime, timezone
 
+try:
+    import msgpack
+except ImportError:  # the compact encoding is only offered when msgpack is installed
+    msgpack = None
+
+from app.core.config import settings
+from app.core.pubsub import PubSubBackend, create_pubsub
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_DISCONNECT = "disconnect"
+
+# Lifecycle update types sent by the API and the bot manager
+BOT_CREATED = "created"
+BOT_STARTED = "started"
+BOT_STOPPED = "stopped"
+BOT_UPDATED = "updated"
+BOT_DELETED = "deleted"
+BOT_ERROR = "error"
+
+# Bot update types by event class; anything else (position_update) is a tick
+LIFECYCLE_EVENTS = frozenset({BOT_CREATED, BOT_STARTED, BOT_STOPPED, BOT_UPDATED, BOT_DELETED, BOT_ERROR})
+FILL_EVENTS = frozenset({"trade_opened", "martingale_added", "position_closed"})
+
+EVENT_LIFECYCLE = "lifecycle"
+EVENT_FILLS = "fills"
+EVENT_TICKS = "ticks"
+EVENT_CLASSES = {EVENT_LIFECYCLE, EVENT_FILLS, EVENT_TICKS}
+
+# Subscription dimensions a socket can filter bot updates on
+SUBSCRIPTION_DIMENSIONS = ("bots", "symbols", "events")
+
+ENCODING_JSON = "json"
+ENCODING_MSGPACK = "msgpack"
+
+# Sec-WebSocket-Protocol values a client may offer to pick an encoding
+SUBPROTOCOLS = {
+    "tradebuddy.msgpack": ENCODING_MSGPACK,
+    "tradebuddy.json": ENCODING_JSON,
+}
+
+
+def available_encodings() -> Set[str]:
+    return {ENCODING_JSON, ENCODING_MSGPACK} if msgpack is not None else {ENCODING_JSON}
+
+
+def negotiate_encoding(websocket: WebSocket) -> Tuple[str, Optional[str]]:
+    """Encoding and subprotocol to accept a socket with.
+
+    A client picks the encoding by offering one of SUBPROTOCOLS (first
+    supported offer wins) or with an `encoding` query parameter; anything
+    else gets JSON.
+    """
+    encodings = available_encodings()
+    for subprotocol in websocket.scope.get("subprotocols") or []:
+        encoding = SUBPROTOCOLS.get(subprotocol)
+        if encoding in encodings:
+            return encoding, subprotocol
+    encoding = websocket.query_params.get("encoding", ENCODING_JSON)
+    return (encoding if encoding in encodings else ENCODING_JSON), None
+
+
+def _epoch_ms(value: Union[str, datetime]) -> Union[int, str]:
+    """Milliseconds since the epoch of an ISO or naive UTC timestamp"""
+    try:
+        moment = datetime.fromisoformat(value) if isinstance(value, str) else value
+    except ValueError:
+        return value
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+
+def _pack_default(value):
+    if isinstance(value, datetime):
+        return _epoch_ms(value)
+    return str(value)
+
+
+def encode(message: dict, encoding: str) -> Union[str, bytes]:
+    """Serialize a message for one encoding; msgpack carries timestamps as epoch milliseconds"""
+    if encoding == ENCODING_MSGPACK:
+        if "timestamp" in message:
+            message = {**message, "timestamp": _epoch_ms(message["timestamp"])}
+        return msgpack.packb(message, default=_pack_default, use_bin_type=True)
+    return json.dumps(message, default=str)
+
+
+def event_class(update_type: str) -> str:
+    if update_type in FILL_EVENTS:
+        return EVENT_FILLS
+    if update_type in LIFECYCLE_EVENTS:
+        return EVENT_LIFECYCLE
+    return EVENT_TICKS
+
+
+class Outbound:
+    """One message and its payload per encoding, each serialized at most once"""
+
+    __slots__ = ("message", "payloads")
+
+    def __init__(self, message: Optional[dict] = None, payload: Optional[str] = None):
+        self.message = message
+        self.payloads: Dict[str, Union[str, bytes]] = {}
+        if payload is not None:
+            self.payloads[ENCODING_JSON] = payload
+
+    def decoded(self) -> dict:
+        if self.message is None:
+            # Received from another worker as JSON
+            self.message = json.loads(self.payloads[ENCODING_JSON])
+        return self.message
+
+    def payload(self, encoding: str) -> Union[str, bytes]:
+        payload = self.payloads.get(encoding)
+        if payload is None:
+            payload = encode(self.decoded(), encoding)
+            self.payloads[encoding] = payload
+        return payload
+
+    def route(self) -> Optional[Tuple[str, Optional[str], str]]:
+        """(bot, symbol, event class) of a bot update, None for messages every socket gets"""
+        message = self.decoded()
+        if message.get("type") != "bot_update":
+            return None
+        data = message.get("data")
+        symbol = data.get("symbol") if isinstance(data, dict) else None
+        return str(message.get("bot_id")), symbol, event_class(message.get("update_type"))
+
+
+class ClientConnection:
+    """One client socket with a bounded outbound queue drained by its own writer task"""
+
+    __slots__ = ("websocket", "user_id", "encoding", "filters", "queue", "max_queue", "overflow", "_ready",
+                 "_writer", "closed")
+
+    def __init__(self, websocket: WebSocket, user_id: str, max_queue: int, overflow: str,
+                 encoding: str = ENCODING_JSON):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.encoding = encoding
+        # Watched values per subscription dimension; a missing dimension matches everything
+        self.filters: Dict[str, Set[str]] = {}
+        self.queue: deque = deque()
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self._ready = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        self.closed = False
+
+    def subscriptions(self) -> dict:
+        return {
+            dimension: sorted(self.filters[dimension]) if dimension in self.filters else "*"
+            for dimension in SUBSCRIPTION_DIMENSIONS
+        }
+
+    def start(self, on_error):
+        self._writer = asyncio.create_task(self._write_loop(on_error))
+
+    def enqueue(self, payload: Union[str, bytes]) -> bool:
+        """Queue an already serialized message, False if the client must be dropped"""
+        if self.closed:
+            return False
+        if len(self.queue) >= self.max_queue:
+            if self.overflow == OVERFLOW_DISCONNECT:
+                return False
+            self.queue.popleft()
+        self.queue.append(payload)
+        self._ready.set()
+        return True
+
+    async def _write_loop(self, on_error):
+        try:
+            while True:
+                await self._ready.wait()
+                while self.queue:
+                    payload = self.queue.popleft()
+                    if isinstance(payload, bytes):
+                        await self.websocket.send_bytes(payload)
+                    else:
+                        await self.websocket.send_text(payload)
+                self._ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            on_error(self)
+
+    async def close(self, code: int = 1000):
+        self.closed = True
+        if self._writer and not self._writer.done() and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+
+class SubscriptionIndex:
+    """Sockets of one user indexed by the bots, symbols and event classes they watch.
+
+    A socket gets a bot update when every dimension it filters on contains
+    the update's value; updates without a symbol (lifecycle events) pass the
+    symbol filter.
+    """
 
-class ConnectionManager:
     def __init__(self):
-        self.active_connections: Dict[str, Set[WebSocket]] = {}
-        
-    async def connect(self, websocket: WebSocket, user_id: str):
-        await websocket.accept()
+        self.connections: Set[ClientConnection] = set()
+        # Per dimension: watched value -> sockets, and every socket filtering on it
+        self.index: Dict[str, Dict[str, Set[ClientConnection]]] = {d: {} for d in SUBSCRIPTION_DIMENSIONS}
+        self.filtered: Dict[str, Set[ClientConnection]] = {d: set() for d in SUBSCRIPTION_DIMENSIONS}
+
+    def add(self, connection: ClientConnection):
+        self.connections.add(connection)
+        for dimension in connection.filters:
+            self._index(connection, dimension)
+
+    def remove(self, connection: ClientConnection):
+        for dimension in SUBSCRIPTION_DIMENSIONS:
+            self._unindex(connection, dimension)
+        self.connections.discard(connection)
+
+    def _index(self, connection: ClientConnection, dimension: str):
+        self.filtered[dimension].add(connection)
+        index = self.index[dimension]
+        for value in connection.filters[dimension]:
+            index.setdefault(value, set()).add(connection)
+
+    def _unindex(self, connection: ClientConnection, dimension: str):
+        if connection not in self.filtered[dimension]:
+            return
+        self.filtered[dimension].discard(connection)
+        index = self.index[dimension]
+        for value in connection.filters.get(dimension, ()):
+            watchers = index.get(value)
+            if watchers is not None:
+                watchers.discard(connection)
+                if not watchers:
+                    del index[value]
+
+    def update(self, connection: ClientConnection, action: str, dimension: str, values):
+        """Apply a subscribe/unsubscribe of values ("*" for all) on one dimension.
+
+        Subscribing narrows an unfiltered dimension to the given values and
+        extends a filtered one. Unsubscribing removes values from a filter;
+        bots and symbols cannot be excluded from an unfiltered dimension.
+        """
+        current = connection.filters.get(dimension)
+        if values == "*":
+            updated = None if action == "subscribe" else set()
+        elif action == "subscribe":
+            updated = set(values) if current is None else current | set(values)
+        elif current is not None:
+            updated = current - set(values)
+        elif dimension == "events":
+            updated = EVENT_CLASSES - set(values)
+        else:
+            return
+
+        self._unindex(connection, dimension)
+        if updated is None:
+            connection.filters.pop(dimension, None)
+        else:
+            connection.filters[dimension] = updated
+            self._index(connection, dimension)
+
+    def is_filtered(self) -> bool:
+        return any(self.filtered.values())
+
+    def match(self, bot_id: str, symbol: Optional[str], event: str) -> Set[ClientConnection]:
+        recipients = self.connections
+        for dimension, value in (("bots", bot_id), ("symbols", symbol), ("events", event)):
+            filtered = self.filtered[dimension]
+            if not filtered or value is None:
+                continue
+            watchers = self.index[dimension].get(value, set())
+            recipients = (recipients - filtered) | (recipients & watchers)
+        return recipients
+
+
+def parse_subscription(command: dict) -> Dict[str, Union[str, List[str]]]:
+    """Dimensions and values of a subscribe/unsubscribe command, ValueError if malformed"""
+    changes = {}
+    for dimension in SUBSCRIPTION_DIMENSIONS:
+        values = command.get(dimension)
+        if values is None:
+            continue
+        if values == "*":
+            changes[dimension] = values
+            continue
+        if isinstance(values, str):
+            values = [values]
+        if not isinstance(values, list):
+            raise ValueError(f"{dimension} must be a list or \"*\"")
+        values = [str(value) for value in values]
+        if dimension == "events":
+            unknown = set(values) - EVENT_CLASSES
+            if unknown:
+                raise ValueError(f"Unknown event classes: {', '.join(sorted(unknown))}")
+        changes[dimension] = values
+    if not changes:
+        raise ValueError(f"Nothing to {command.get('action')}, expected one of {', '.join(SUBSCRIPTION_DIMENSIONS)}")
+    return changes
+
+
+class ConnectionManager:
+    """Fans messages out to users' sockets without waiting on them.
+
+    Each message is serialized once per encoding in use and the same payload
+    is queued on every recipient's connection; a writer task per connection
+    sends it. Clients get JSON text frames unless they negotiated msgpack
+    binary frames (see negotiate_encoding). When a
+    client falls WEBSOCKET_SEND_QUEUE_SIZE messages behind, the overflow
+    policy either drops its oldest queued message or disconnects it.
+
+    Sockets may subscribe to specific bots, symbols and event classes
+    (lifecycle, fills, ticks); a SubscriptionIndex per user routes each bot
+    update only to the sockets watching it. Sockets that never subscribe
+    get everything.
+
+    Ticks are coalesced: within WEBSOCKET_COALESCE_WINDOW seconds only the
+    latest update per (bot, symbol, update type) is sent. A lifecycle event
+    or fill first flushes the bot's pending updates so clients see them in
+    order.
+
+    With a pub/sub transport (WEBSOCKET_PUBSUB_BACKEND) messages go out on a
+    per-user channel instead, and one listener per process delivers them to
+    the sockets connected here, so a bot on one worker reaches a user
+    connected to another.
+    """
+
+    def __init__(self, max_queue: Optional[int] = None, overflow: Optional[str] = None,
+                 coalesce_window: Optional[float] = None, transport: Optional[PubSubBackend] = None,
+                 pubsub_backend: Optional[str] = None):
+        self.active_connections: Dict[str, Set[ClientConnection]] = {}
+        self.connections: Dict[WebSocket, ClientConnection] = {}
+        self.routes: Dict[str, SubscriptionIndex] = {}
+        self.max_queue = max_queue or settings.WEBSOCKET_SEND_QUEUE_SIZE
+        self.overflow = overflow or settings.WEBSOCKET_OVERFLOW_POLICY
+        self.coalesce_window = (
+            coalesce_window if coalesce_window is not None else settings.WEBSOCKET_COALESCE_WINDOW
+        )
+        # Latest coalescable update per user and (bot, symbol, update type)
+        self._pending: Dict[str, Dict[Tuple[str, Optional[str], str], dict]] = {}
+        self._flush_handles: Dict[str, asyncio.TimerHandle] = {}
+        self.transport = transport or create_pubsub(pubsub_backend)
+        # (channel, payload, is tick) waiting to be published, sent in batches by one task
+        self._outbox: deque = deque()
+        self._outbox_ready = asyncio.Event()
+        self.max_outbox = settings.WEBSOCKET_PUBLISH_QUEUE_SIZE
+        # Messages dropped because the outbox was full, ticks and others
+        self.dropped_ticks = 0
+        self.dropped_events = 0
+        self._subscription_lock = asyncio.Lock()
+        self._tasks: List[asyncio.Task] = []
+        # Subscription syncs and socket closes started from sync code, kept until done
+        self._background: Set[asyncio.Task] = set()
+
+    def channel(self, user_id: str) -> str:
+        return f"{settings.WEBSOCKET_CHANNEL_PREFIX}{user_id}"
+
+    def _spawn(self, coro) -> asyncio.Task:
+        """Run a coroutine in the background, holding a reference until it finishes"""
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    def start(self):
+        """Start the pub/sub listener and publisher of this process"""
+        if self.transport is None or any(not task.done() for task in self._tasks):
+            return
+        self._tasks = [
+            asyncio.create_task(self._listen()),
+            asyncio.create_task(self._publish_outbox()),
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        if self.transport:
+            await self.transport.close()
+
+    async def _listen(self):
+        prefix_length = len(settings.WEBSOCKET_CHANNEL_PREFIX)
+        while True:
+            try:
+                async for channel, payload in self.transport.listen():
+                    self._deliver(channel[prefix_length:], Outbound(payload=payload))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"WebSocket pub/sub listener failed: {e}")
+                await asyncio.sleep(1.0)
+
+    async def _publish_outbox(self):
+        while True:
+            await self._outbox_ready.wait()
+            self._outbox_ready.clear()
+            while self._outbox:
+                batch = [self._outbox.popleft()[:2] for _ in range(min(len(self._outbox), 500))]
+                try:
+                    await self.transport.publish_many(batch)
+                except Exception as e:
+                    logger.error(f"Dropped {len(batch)} websocket messages, publish failed: {e}")
+
+    async def _sync_subscription(self, user_id: str):
+        """Subscribe to a user's channel while they have sockets here, unsubscribe after"""
+        if self.transport is None:
+            return
+        async with self._subscription_lock:
+            try:
+                if user_id in self.active_connections:
+                    await self.transport.subscribe(self.channel(user_id))
+                else:
+                    await self.transport.unsubscribe(self.channel(user_id))
+            except Exception as e:
+                logger.error(f"Error updating websocket subscription of user {user_id}: {e}")
+
+    async def connect(self, websocket: WebSocket, user_id: str, encoding: str = ENCODING_JSON,
+                      subprotocol: Optional[str] = None):
+        await websocket.accept(subprotocol=subprotocol)
+        connection = ClientConnection(websocket, user_id, self.max_queue, self.overflow, encoding)
+        connection.start(self._drop)
+        self.connections[websocket] = connection
         if user_id not in self.active_connections:
             self.active_connections[user_id] = set()
-        self.active_connections[user_id].add(websocket)
-        
+            self.routes[user_id] = SubscriptionIndex()
+        self.active_connections[user_id].add(connection)
+        self.routes[user_id].add(connection)
+        await self._sync_subscription(user_id)
+
     def disconnect(self, websocket: WebSocket, user_id: str):
+        connection = self.connections.pop(websocket, None)
+        if connection is None:
+            return
+        connection.closed = True
+        if connection._writer and not connection._writer.done():
+            connection._writer.cancel()
         if user_id in self.active_connections:
-            self.active_connections[user_id].discard(websocket)
+            self.active_connections[user_id].discard(connection)
+            self.routes[user_id].remove(connection)
             if not self.active_connections[user_id]:
                 del self.active_connections[user_id]
-                
+                del self.routes[user_id]
+                if self.transport is not None:
+                    self._spawn(self._sync_subscription(user_id))
+
+    def _drop(self, connection: ClientConnection, code: int = 1011):
+        """Remove a failed or too slow client and close its socket in the background"""
+        self.disconnect(connection.websocket, connection.user_id)
+        self._spawn(connection.close(code))
+
+    def send_to(self, websocket: WebSocket, text: str):
+        """Queue raw text on one socket (replies from the endpoint go through its writer)"""
+        connection = self.connections.get(websocket)
+        if connection and not connection.enqueue(text):
+            self._drop(connection, code=1013)
+
+    def reply(self, connection: ClientConnection, message: dict):
+        """Queue a message for one socket in its encoding"""
+        if not connection.enqueue(encode(message, connection.encoding)):
+            self._drop(connection, code=1013)
+
+    def handle_command(self, websocket: WebSocket, frame: Union[str, bytes]):
+        """Apply a subscribe/unsubscribe command sent by a client and reply with its subscriptions.
+
+        Commands are JSON text (or msgpack binary on msgpack sockets), e.g.
+        {"action": "subscribe", "bots": ["<bot uuid>"], "events": ["lifecycle", "fills"]}.
+        """
+        connection = self.connections.get(websocket)
+        if connection is None:
+            return
+        try:
+            command = json.loads(frame) if isinstance(frame, str) else msgpack.unpackb(frame)
+        except Exception:
+            command = None
+        action = command.get("action") if isinstance(command, dict) else None
+        if action not in ("subscribe", "unsubscribe"):
+            self.reply(connection, {"type": "error", "error": "Expected a subscribe or unsubscribe command"})
+            return
+        try:
+            changes = parse_subscription(command)
+        except ValueError as e:
+            self.reply(connection, {"type": "error", "error": str(e)})
+            return
+
+        index = self.routes[connection.user_id]
+        for dimension, values in changes.items():
+            index.update(connection, action, dimension, values)
+        self.reply(connection, {"type": "subscriptions", **connection.subscriptions()})
+
+    def _recipients(self, user_id: str, outbound: Outbound) -> Iterable[ClientConnection]:
+        """Sockets of the user in this process that watch a message"""
+        connections = self.active_connections.get(user_id)
+        if not connections:
+            return ()
+        index = self.routes[user_id]
+        if not index.is_filtered():
+            return list(connections)
+        route = outbound.route()
+        if route is None:
+            return list(connections)
+        return list(index.match(*route))
+
+    def publish(self, message: dict, user_id: str):
+        """Serialize once and deliver to every socket of the user; never waits on clients"""
+        if self.transport is None:
+            self._deliver(user_id, Outbound(message))
+            return
+        is_tick = message.get("type") == "bot_update" and event_class(message.get("update_type")) == EVENT_TICKS
+        if len(self._outbox) >= self.max_outbox and not self._make_room(is_tick):
+            return
+        # Workers exchange JSON; each re-encodes for its own msgpack clients
+        self._outbox.append((self.channel(user_id), encode(message, ENCODING_JSON), is_tick))
+        self._outbox_ready.set()
+
+    def _make_room(self, is_tick: bool) -> bool:
+        """Free a slot in the full outbox, False if the new message should be dropped.
+
+        The oldest queued tick goes first; a new tick is dropped rather than
+        an older lifecycle event or fill, which are only dropped (and logged)
+        when the outbox holds nothing else.
+        """
+        for position, (_, _, queued_tick) in enumerate(self._outbox):
+            if queued_tick:
+                del self._outbox[position]
+                self._count_drop(True)
+                return True
+        if is_tick:
+            self._count_drop(True)
+            return False
+        self._outbox.popleft()
+        self._count_drop(False)
+        return True
+
+    def _count_drop(self, is_tick: bool):
+        if is_tick:
+            self.dropped_ticks += 1
+            if self.dropped_ticks % 1000 == 1:
+                logger.warning(f"WebSocket publish queue full, {self.dropped_ticks} ticks dropped so far")
+        else:
+            self.dropped_events += 1
+            logger.error(
+                f"WebSocket publish queue full of lifecycle events and fills, dropped one "
+                f"({self.dropped_events} so far)"
+            )
+
+    def _deliver(self, user_id: str, outbound: Outbound):
+        """Queue a message on the user's sockets in this process that watch it"""
+        for connection in self._recipients(user_id, outbound):
+            if not connection.enqueue(outbound.payload(connection.encoding)):
+                logger.warning(f"Disconnecting slow websocket client of user {user_id}")
+                self._drop(connection, code=1013)
+
     async def send_personal_message(self, message: dict, user_id: str):
-        if user_id in self.active_connections:
-            disconnected = set()
-            for connection in self.active_connections[user_id]:
-                try:
-                    await connection.send_json(message)
-                except:
-                    disconnected.add(connection)
-            
-            # Clean up disconnected websockets
-            for conn in disconnected:
-                self.disconnect(conn, user_id)
-                
+        self.publish(message, user_id)
+
     async def broadcast_to_user(self, user_id: str, event_type: str, data: dict):
         message = {
             "type": event_type,
             "data": data,
             "timestamp": datetime.utcnow().isoformat()
         }
-        await self.send_personal_message(message, user_id)
-        
+        self.publish(message, user_id)
+
     async def broadcast_bot_update(self, user_id: str, bot_id: str, update_type: str, data: dict):
         message = {
             "type": "bot_update",
@@ -50,16 +585,47 @@ class ConnectionManager:
             "data": data,
             "timestamp": datetime.utcnow().isoformat()
         }
-        await self.send_personal_message(message, user_id)
-        
+        if update_type in LIFECYCLE_EVENTS or update_type in FILL_EVENTS or self.coalesce_window <= 0:
+            self._flush_bot(user_id, bot_id)
+            self.publish(message, user_id)
+            return
+        if self.transport is None and not self._recipients(user_id, Outbound(message)):
+            return
+
+        symbol = data.get("symbol") if isinstance(data, dict) else None
+        self._pending.setdefault(user_id, {})[(bot_id, symbol, update_type)] = message
+        if user_id not in self._flush_handles:
+            self._flush_handles[user_id] = asyncio.get_running_loop().call_later(
+                self.coalesce_window, self._flush_user, user_id
+            )
+
+    def _flush_user(self, user_id: str):
+        """Send the latest pending update of every key of a user"""
+        self._flush_handles.pop(user_id, None)
+        pending = self._pending.pop(user_id, None)
+        if pending:
+            for message in pending.values():
+                self.publish(message, user_id)
+
+    def _flush_bot(self, user_id: str, bot_id: str):
+        """Send a bot's pending updates ahead of one of its lifecycle events"""
+        pending = self._pending.get(user_id)
+        if not pending:
+            return
+        for key in [key for key in pending if key[0] == bot_id]:
+            self.publish(pending.pop(key), user_id)
+
     async def disconnect_all(self):
-        for user_id in list(self.active_connections.keys()):
-            for connection in list(self.active_connections[user_id]):
-                try:
-                    await connection.close()
-                except:
-                    pass
-            del self.active_connections[user_id]
+        for handle in self._flush_handles.values():
+            handle.cancel()
+        self._flush_handles.clear()
+        self._pending.clear()
+        connections = list(self.connections.values())
+        self.connections.clear()
+        self.active_connections.clear()
+        self.routes.clear()
+        for connection in connections:
+            await connection.close()
 
 
-websocket_manager = ConnectionManager()
\ No newline at end of file
+websocket_manager = ConnectionManager()
@@ -0,0 +1,16 @@
+from sqlalchemy.exc import DataError, IntegrityError, ProgrammingError
+
+# Errors retrying the same rows cannot fix (a deleted bot, a bad value)
+PERMANENT_ERRORS = (DataError, IntegrityError, ProgrammingError)
+
+
+def default_session_factory(session_factory=None):
+    """The given session factory, else the app's.
+
+    app.db.session creates the engine on import, so it is only imported when
+    a service is built without a factory of its own (tests pass theirs).
+    """
+    if session_factory is None:
+        from app.db.session import AsyncSessionLocal
+        session_factory = AsyncSessionLocal
+    return session_factory
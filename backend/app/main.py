@@ -6,6 +6,9 @@ from app.core.config import settings
 from app.api.api_v1.api import api_router
 from app.db.init_db import init_db
 from app.core.websocket import websocket_manager
+from app.services.bot_supervisor import bot_supervisor
+from app.trading.exchange_pool import exchange_pool
+from app.trading.markets import market_metadata
 
 
 @asynccontextmanager
@@ -17,10 +20,19 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"Warning: Database initialization failed: {e}")
         print("API will start without database connection")
+    market_metadata.start()
+    exchange_pool.start()
+    websocket_manager.start()
+    # Resumes RUNNING bots in the background, then keeps supervising them
+    bot_supervisor.start()
     yield
     # Shutdown
     print("Shutting down TradeBuddy API...")
+    await bot_supervisor.stop()
+    await market_metadata.stop()
+    await exchange_pool.close_all()
     await websocket_manager.disconnect_all()
+    await websocket_manager.stop()
 
 
 app = FastAPI(
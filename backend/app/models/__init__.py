@@ -1,7 +1,8 @@
 from app.models.user import User
-from app.models.bot import Bot, BotConfig, BotPosition, Trade
+from app.models.bot import Bot, BotConfig, BotPosition, Trade, BotStatus, TradingMode
 from app.models.subscription import Subscription, SubscriptionTier
 from app.models.api_key import ExchangeApiKey
+from app.models.lease import BotLease, WorkerHeartbeat
 
 __all__ = [
     "User",
@@ -9,7 +10,11 @@ __all__ = [
     "BotConfig", 
     "BotPosition",
     "Trade",
+    "BotStatus",
+    "TradingMode",
     "Subscription",
     "SubscriptionTier",
-    "ExchangeApiKey"
+    "ExchangeApiKey",
+    "BotLease",
+    "WorkerHeartbeat"
 ]
\ No newline at end of file
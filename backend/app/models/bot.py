@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean, Float, Integer, ForeignKey, JSON, Enum
+from sqlalchemy import Column, String, Boolean, Float, Integer, ForeignKey, JSON, Enum, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
@@ -88,6 +88,8 @@ class BotConfig(BaseModel):
 
 class BotPosition(BaseModel):
     __tablename__ = "bot_positions"
+    # One row per bot and symbol, upserted by the position checkpointer
+    __table_args__ = (UniqueConstraint("bot_id", "symbol", name="uq_bot_positions_bot_symbol"),)
     
     bot_id = Column(Integer, ForeignKey("bots.id"), nullable=False)
     bot = relationship("Bot", back_populates="positions")
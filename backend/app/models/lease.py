@@ -0,0 +1,20 @@
+from sqlalchemy import Column, String, DateTime
+
+from app.db.base import BaseModel
+
+
+class BotLease(BaseModel):
+    """Which worker process currently runs a bot, valid until expires_at"""
+    __tablename__ = "bot_leases"
+    
+    bot_uuid = Column(String, unique=True, index=True, nullable=False)
+    owner = Column(String, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class WorkerHeartbeat(BaseModel):
+    """Liveness of a bot supervisor worker, refreshed on every heartbeat"""
+    __tablename__ = "worker_heartbeats"
+    
+    worker_id = Column(String, unique=True, index=True, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
@@ -2,10 +2,12 @@ from .user import User, UserCreate, UserUpdate, UserInDB
 from .token import Token, TokenPayload
 from .bot import Bot, BotCreate, BotUpdate, BotDetail, BotConfig
 from .api_key import ApiKeyCreate, ApiKeyUpdate, ApiKeyResponse, ApiKeyTestRequest, ApiKeyTestResponse
+from .backtest import BacktestRequest, BacktestResponse
 
 __all__ = [
     "User", "UserCreate", "UserUpdate", "UserInDB",
     "Token", "TokenPayload",
     "Bot", "BotCreate", "BotUpdate", "BotDetail", "BotConfig",
     "ApiKeyCreate", "ApiKeyUpdate", "ApiKeyResponse", "ApiKeyTestRequest", "ApiKeyTestResponse",
+    "BacktestRequest", "BacktestResponse",
 ]
\ No newline at end of file
@@ -0,0 +1,28 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+
+class BacktestRequest(BaseModel):
+    symbol: Optional[str] = Field(None, description="Symbol to replay, defaults to the bot's first symbol")
+    timeframe: str = Field("1m", description="OHLCV candle timeframe")
+    days: int = Field(30, ge=1, le=365, description="Days of history to replay")
+    fee_rate: float = Field(0.0006, ge=0, description="Taker fee rate charged on every fill")
+    initial_balance: Optional[float] = Field(None, gt=0, description="Starting balance, defaults to the full ladder margin")
+
+
+class BacktestResponse(BaseModel):
+    symbol: str
+    timeframe: str
+    total_pnl: float
+    total_return_pct: float
+    max_drawdown: float
+    max_drawdown_pct: float
+    cycles: int
+    deepest_level: int
+    level_counts: List[int]
+    fees: float
+    open_position: bool
+    liquidated: bool
+    aborted: bool
+    candles: int
+    elapsed: float
@@ -2,11 +2,18 @@ import asyncio
 import logging
 from typing import Dict, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
+from sqlalchemy import select, and_, update
 
-from app.models import Bot, ExchangeApiKey, BotStatus
+from app.core.config import settings
+from app.db.utils import default_session_factory
+from app.models import Bot, ExchangeApiKey, BotStatus, TradingMode
 from app.trading.bot_engine import TradingBot
-from app.core.websocket import websocket_manager
+from app.trading.account_state import AccountStateService
+from app.trading.checkpoint import PositionCheckpointer
+from app.trading.ledger import TradeLedger
+from app.trading.market_data import MarketDataHub
+from app.services.subscriptions import get_subscription_tier
+from app.core.websocket import BOT_ERROR, BOT_STARTED, BOT_STOPPED, websocket_manager
 
 logger = logging.getLogger(__name__)
 
@@ -14,9 +21,15 @@ logger = logging.getLogger(__name__)
 class BotManager:
     """Manages active trading bot instances"""
     
-    def __init__(self):
+    def __init__(self, session_factory=None):
+        # For writes from bot tasks, which outlive the session that started them
+        self.session_factory = default_session_factory(session_factory)
         self.running_bots: Dict[str, TradingBot] = {}
         self.bot_tasks: Dict[str, asyncio.Task] = {}
+        self.market_data = MarketDataHub()
+        self.account_state = AccountStateService()
+        self.checkpointer = PositionCheckpointer()
+        self.trade_ledger = TradeLedger()
     
     async def start_bot(self, db: AsyncSession, bot: Bot) -> bool:
         """Start a trading bot"""
@@ -26,33 +39,53 @@ class BotManager:
                 logger.warning(f"Bot {bot.uuid} is already running")
                 return False
             
-            # Get user's API key for this exchange
-            api_key_query = select(ExchangeApiKey).where(
-                and_(
-                    ExchangeApiKey.user_id == bot.user_id,
-                    ExchangeApiKey.exchange == bot.exchange,
-                    ExchangeApiKey.is_active == True,
-                    ExchangeApiKey.is_verified == True
-                )
-            )
-            result = await db.execute(api_key_query)
-            api_key = result.scalar_one_or_none()
-            
-            if not api_key:
-                logger.error(f"No verified API key found for user {bot.user_id} on {bot.exchange}")
-                raise ValueError(f"No verified API key found for {bot.exchange}")
-            
-            # Get decrypted credentials
-            credentials = api_key.get_credentials()
+            if bot.mode == TradingMode.BACKTEST:
+                raise ValueError("Backtest bots cannot be started, use the backtest endpoint")
             
-            # Add sandbox flag
-            credentials['sandbox'] = api_key.is_sandbox
+            if bot.mode == TradingMode.PAPER:
+                # Paper bots fill against live public prices, no API key needed
+                credentials = {'sandbox': False}
+                account_key = f"paper:{bot.uuid}"
+                calls_per_minute = None
+            else:
+                # Get user's API key for this exchange
+                api_key_query = select(ExchangeApiKey).where(
+                    and_(
+                        ExchangeApiKey.user_id == bot.user_id,
+                        ExchangeApiKey.exchange == bot.exchange,
+                        ExchangeApiKey.is_active == True,
+                        ExchangeApiKey.is_verified == True
+                    )
+                )
+                result = await db.execute(api_key_query)
+                api_key = result.scalar_one_or_none()
+                
+                if not api_key:
+                    logger.error(f"No verified API key found for user {bot.user_id} on {bot.exchange}")
+                    raise ValueError(f"No verified API key found for {bot.exchange}")
+                
+                # Get decrypted credentials
+                credentials = api_key.get_credentials()
+                
+                # Add sandbox flag
+                credentials['sandbox'] = api_key.is_sandbox
+                account_key = self.account_key(api_key)
+                tier = await get_subscription_tier(db, bot.user_id)
+                calls_per_minute = tier.api_calls_per_minute if tier else None
             
             # Create bot instance
-            bot_instance = TradingBot(bot, bot.config, credentials)
+            bot_instance = TradingBot(
+                bot, bot.config, credentials, self.market_data,
+                self.account_state, account_key, calls_per_minute,
+                self.checkpointer, self.trade_ledger
+            )
+            self.market_data.subscribe(str(bot.uuid), bot.exchange, credentials['sandbox'], bot.symbols)
+            self.market_data.start()
+            self.checkpointer.start()
+            self.trade_ledger.start()
             
             # Start bot in background task
-            task = asyncio.create_task(self._run_bot(bot_instance, db))
+            task = asyncio.create_task(self._run_bot(bot_instance))
             
             # Store references
             self.running_bots[str(bot.uuid)] = bot_instance
@@ -67,7 +100,7 @@ class BotManager:
             await websocket_manager.broadcast_bot_update(
                 str(bot.user_id),
                 str(bot.uuid),
-                "started",
+                BOT_STARTED,
                 {"status": bot.status.value}
             )
             
@@ -83,12 +116,21 @@ class BotManager:
             await websocket_manager.broadcast_bot_update(
                 str(bot.user_id),
                 str(bot.uuid),
-                "error",
+                BOT_ERROR,
                 {"status": bot.status.value, "error": str(e)}
             )
             
             return False
     
+    @staticmethod
+    def account_key(api_key: ExchangeApiKey) -> str:
+        """Key under which bots on the same API key share balance and leverage state"""
+        return f"{api_key.exchange}:{api_key.id}"
+    
+    def forget_api_key(self, api_key: ExchangeApiKey):
+        """Drop cached account state after an API key was changed or deleted"""
+        self.account_state.forget_account(self.account_key(api_key))
+    
     async def stop_bot(self, db: AsyncSession, bot: Bot) -> bool:
         """Stop a trading bot"""
         try:
@@ -103,23 +145,8 @@ class BotManager:
                 await db.commit()
                 return True
             
-            # Stop the bot instance
-            bot_instance = self.running_bots[bot_uuid_str]
-            await bot_instance.stop()
-            
-            # Cancel the task
-            if bot_uuid_str in self.bot_tasks:
-                task = self.bot_tasks[bot_uuid_str]
-                if not task.done():
-                    task.cancel()
-                    try:
-                        await task
-                    except asyncio.CancelledError:
-                        pass
-                del self.bot_tasks[bot_uuid_str]
-            
-            # Remove from running bots
-            del self.running_bots[bot_uuid_str]
+            # Stop the bot instance and its task
+            await self.detach_bot(bot_uuid_str)
             
             # Update bot status
             bot.status = BotStatus.STOPPED
@@ -130,7 +157,7 @@ class BotManager:
             await websocket_manager.broadcast_bot_update(
                 str(bot.user_id),
                 str(bot.uuid),
-                "stopped",
+                BOT_STOPPED,
                 {"status": bot.status.value}
             )
             
@@ -141,7 +168,62 @@ class BotManager:
             logger.error(f"Failed to stop bot {bot.uuid}: {str(e)}")
             return False
     
-    async def _run_bot(self, bot_instance: TradingBot, db: AsyncSession):
+    async def detach_bot(self, bot_uuid: str) -> bool:
+        """Stop running a bot in this process without changing its stored status.
+        
+        Used when the bot is handed to another worker or was stopped elsewhere.
+        """
+        bot_instance = self.running_bots.pop(bot_uuid, None)
+        if bot_instance is None:
+            return False
+        await bot_instance.stop()
+        
+        task = self.bot_tasks.pop(bot_uuid, None)
+        if task:
+            await self._finish_tasks([task])
+        
+        self.market_data.unsubscribe(bot_uuid)
+        # Persist its latest state before another worker restores it
+        await self.checkpointer.flush()
+        return True
+    
+    async def detach_stopped_bot(self, bot_uuid: str) -> bool:
+        """Detach a bot that was stopped through another worker and announce the stop"""
+        bot_instance = self.running_bots.get(bot_uuid)
+        if bot_instance is None or not await self.detach_bot(bot_uuid):
+            return False
+        await websocket_manager.broadcast_bot_update(
+            str(bot_instance.bot.user_id),
+            bot_uuid,
+            BOT_STOPPED,
+            {"status": BotStatus.STOPPED.value}
+        )
+        logger.info(f"Bot {bot_uuid} stopped through another worker")
+        return True
+    
+    async def _finish_tasks(self, tasks):
+        """Wait for stopped bots to leave their loop, cancelling only those still stuck.
+        
+        Cancelling right away could interrupt an order that fills on the
+        exchange before its state and checkpoint are recorded.
+        """
+        tasks = [task for task in tasks if not task.done()]
+        if not tasks:
+            return
+        _, stuck = await asyncio.wait(tasks, timeout=settings.BOT_STOP_TIMEOUT)
+        for task in stuck:
+            logger.warning("Bot task did not stop in time, cancelling it")
+            task.cancel()
+        if stuck:
+            await asyncio.gather(*stuck, return_exceptions=True)
+    
+    async def _set_status(self, bot_id: int, status: BotStatus):
+        """Store a bot's status in a session of its own"""
+        async with self.session_factory() as db:
+            await db.execute(update(Bot).where(Bot.id == bot_id).values(status=status))
+            await db.commit()
+    
+    async def _run_bot(self, bot_instance: TradingBot):
         """Run bot instance in background"""
         try:
             await bot_instance.start()
@@ -156,15 +238,17 @@ class BotManager:
         except Exception as e:
             logger.error(f"Bot {bot_instance.bot.uuid} crashed: {str(e)}")
             
-            # Update bot status to error
-            bot_instance.bot.status = BotStatus.ERROR
-            await db.commit()
+            # Update bot status to error (the starting session is closed by now)
+            try:
+                await self._set_status(bot_instance.bot.id, BotStatus.ERROR)
+            except Exception as db_error:
+                logger.error(f"Could not mark bot {bot_instance.bot.uuid} as errored: {db_error}")
             
             # Send error notification
             await websocket_manager.broadcast_bot_update(
                 str(bot_instance.bot.user_id),
                 str(bot_instance.bot.uuid),
-                "error",
+                BOT_ERROR,
                 {"status": BotStatus.ERROR.value, "error": str(e)}
             )
             
@@ -174,6 +258,9 @@ class BotManager:
                 del self.running_bots[bot_uuid_str]
             if bot_uuid_str in self.bot_tasks:
                 del self.bot_tasks[bot_uuid_str]
+            self.market_data.unsubscribe(bot_uuid_str)
+        finally:
+            await bot_instance.close()
     
     def get_running_bot(self, bot_uuid: str) -> Optional[TradingBot]:
         """Get running bot instance"""
@@ -192,16 +279,17 @@ class BotManager:
         if tasks:
             await asyncio.gather(*tasks, return_exceptions=True)
         
-        # Cancel all tasks
-        for task in self.bot_tasks.values():
-            if not task.done():
-                task.cancel()
-        
-        if self.bot_tasks:
-            await asyncio.gather(*self.bot_tasks.values(), return_exceptions=True)
+        # Let each loop finish its iteration, cancel the stuck ones
+        await self._finish_tasks(list(self.bot_tasks.values()))
         
         self.running_bots.clear()
         self.bot_tasks.clear()
+        await self.checkpointer.stop()
+        await self.trade_ledger.stop()
+        await self.market_data.stop()
+        self.market_data.clear()
+        self.account_state.clear()
+        await self.market_data.close()
 
 
 # Global bot manager instance
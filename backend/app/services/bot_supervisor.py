@@ -0,0 +1,301 @@
+import asyncio
+import logging
+import math
+import os
+import socket
+import time
+import uuid
+from typing import Dict, Iterable, Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.core.config import settings
+from app.db.utils import default_session_factory
+from app.core.pubsub import PubSubBackend, create_pubsub
+from app.models import Bot, BotStatus
+from app.services.bot_manager import BotManager, bot_manager
+from app.services.leases import InMemoryLeaseStore, LeaseStore, create_lease_store
+
+logger = logging.getLogger(__name__)
+
+
+class BotSupervisor:
+    """Assigns RUNNING bots to worker processes through leases.
+
+    Every worker runs one supervisor. On each heartbeat it renews the leases
+    of the bots it runs, drops bots whose lease it lost or that were stopped
+    elsewhere, takes over bots whose owner died (lease expired) up to its
+    fair share, and hands one bot at a time to less loaded workers when it
+    runs more than its share. The database status says which bots should run;
+    the lease store says where they run.
+
+    A bot stopped through another worker is dropped on the owner's next
+    heartbeat, or right away when the workers share a pub/sub transport
+    (WEBSOCKET_PUBSUB_BACKEND): the stopping worker publishes the bot on
+    BOT_STOP_CHANNEL and the owner detaches it and announces the stop.
+    """
+
+    def __init__(self, manager: BotManager, store: Optional[LeaseStore] = None,
+                 worker_id: Optional[str] = None, session_factory=None,
+                 lease_ttl: Optional[float] = None, heartbeat_interval: Optional[float] = None,
+                 transport: Optional[PubSubBackend] = None):
+        self.manager = manager
+        self.store = store or create_lease_store()
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.session_factory = default_session_factory(session_factory)
+        self.lease_ttl = lease_ttl if lease_ttl is not None else settings.BOT_LEASE_TTL
+        self.heartbeat_interval = (
+            heartbeat_interval if heartbeat_interval is not None else settings.BOT_HEARTBEAT_INTERVAL
+        )
+        self.transport = transport or create_pubsub()
+        # Whether this worker takes over bots nobody runs (see start)
+        self.takeover = True
+        self._task: Optional[asyncio.Task] = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start_bot(self, db: AsyncSession, bot: Bot) -> bool:
+        """Start a bot on this worker unless another worker already runs it"""
+        bot_id = str(bot.uuid)
+        if not await self.store.acquire(bot_id, self.worker_id, self.lease_ttl):
+            logger.warning(f"Bot {bot_id} is already leased by another worker")
+            return False
+        started = await self.manager.start_bot(db, bot)
+        if not started and not self.manager.is_bot_running(bot_id):
+            await self.store.release(bot_id, self.worker_id)
+        return started
+
+    async def stop_bot(self, db: AsyncSession, bot: Bot) -> bool:
+        """Stop a bot wherever it runs.
+
+        A bot running here is stopped directly. Otherwise its status is set to
+        STOPPED and the owning worker is told to drop it (see class docstring).
+        """
+        bot_id = str(bot.uuid)
+        local = self.manager.is_bot_running(bot_id)
+        stopped = await self.manager.stop_bot(db, bot)
+        await self.store.release(bot_id, self.worker_id)
+        if stopped and not local and self.transport is not None:
+            try:
+                await self.transport.publish(settings.BOT_STOP_CHANNEL, bot_id)
+            except Exception as e:
+                logger.warning(f"Could not notify the owner of stopped bot {bot_id}: {e}")
+        return stopped
+
+    async def owner(self, bot_id: str) -> Optional[str]:
+        """Worker currently running the bot, if any"""
+        return await self.store.owner(bot_id)
+
+    async def _load_running_bots(self) -> Dict[str, Bot]:
+        async with self.session_factory() as db:
+            query = select(Bot).options(selectinload(Bot.config)).where(Bot.status == BotStatus.RUNNING)
+            result = await db.execute(query)
+            return {str(bot.uuid): bot for bot in result.scalars().all()}
+
+    async def _load_statuses(self, bot_ids: Iterable[str]) -> Dict[str, BotStatus]:
+        async with self.session_factory() as db:
+            query = select(Bot.uuid, Bot.status).where(Bot.uuid.in_(list(bot_ids)))
+            result = await db.execute(query)
+            return {str(bot_uuid): status for bot_uuid, status in result.all()}
+
+    async def _drop_stopped(self, bot_ids: Set[str]) -> Set[str]:
+        """Detach local bots that should no longer run here and give up their leases.
+
+        Bots whose stored status is STOPPED were stopped through another
+        worker, which cannot announce it; their stop is broadcast from here.
+        """
+        if not bot_ids:
+            return set()
+        statuses = await self._load_statuses(bot_ids)
+        dropped = set()
+        for bot_id in bot_ids:
+            status = statuses.get(bot_id)
+            if status == BotStatus.RUNNING:
+                continue
+            if status == BotStatus.STOPPED:
+                await self.manager.detach_stopped_bot(bot_id)
+            else:
+                await self.manager.detach_bot(bot_id)
+            await self.store.release(bot_id, self.worker_id)
+            dropped.add(bot_id)
+        return dropped
+
+    async def _start_local(self, bot: Bot) -> bool:
+        """Start a bot re-read in the session used for the start, so status changes are saved"""
+        async with self.session_factory() as db:
+            query = select(Bot).options(selectinload(Bot.config)).where(Bot.id == bot.id)
+            bot = (await db.execute(query)).scalar_one_or_none()
+            if bot is None or bot.status != BotStatus.RUNNING:
+                return False
+            return await self.manager.start_bot(db, bot)
+
+    async def _start_acquired(self, bots: Dict[str, Bot]) -> int:
+        """Start newly leased bots concurrently, returning how many started.
+        
+        Starts are staggered by BOT_RESUME_STAGGER and at most
+        BOT_RESUME_CONCURRENCY run at once, so a restart does not fire every
+        key decryption, market load and exchange call at the same moment.
+        A large batch outlasts the lease TTL while reconcile waits on it, so
+        the worker heartbeat and every lease of this worker (bots already
+        running here as well as the batch) are kept alive meanwhile.
+        """
+        semaphore = asyncio.Semaphore(settings.BOT_RESUME_CONCURRENCY)
+        
+        async def start_one(index: int, bot_id: str) -> bool:
+            await asyncio.sleep(index * settings.BOT_RESUME_STAGGER)
+            async with semaphore:
+                try:
+                    started = await self._start_local(bots[bot_id])
+                except Exception as e:
+                    logger.error(f"Error starting bot {bot_id}: {e}")
+                    started = False
+            if not started and not self.manager.is_bot_running(bot_id):
+                await self.store.release(bot_id, self.worker_id)
+            return started
+        
+        async def keep_leases():
+            while True:
+                await asyncio.sleep(self.heartbeat_interval)
+                try:
+                    await self.store.heartbeat(self.worker_id, self.lease_ttl)
+                    await self.store.renew(
+                        set(self.manager.running_bots) | bots.keys(), self.worker_id, self.lease_ttl
+                    )
+                except Exception as e:
+                    logger.error(f"Error renewing leases on {self.worker_id}: {e}")
+        
+        keepalive = asyncio.create_task(keep_leases())
+        try:
+            results = await asyncio.gather(*(start_one(i, bot_id) for i, bot_id in enumerate(bots)))
+        finally:
+            keepalive.cancel()
+        return sum(results)
+
+    async def resume(self):
+        """Take over RUNNING bots after startup and report how long it took"""
+        started_at = time.monotonic()
+        started = await self.reconcile()
+        if started:
+            logger.info(f"Resumed {started} bots on {self.worker_id} in {time.monotonic() - started_at:.1f}s")
+
+    async def reconcile(self) -> int:
+        """One heartbeat: renew, drop, take over and rebalance; returns bots started"""
+        await self.store.heartbeat(self.worker_id, self.lease_ttl)
+
+        # Renew our leases; a bot whose lease lapsed may already run elsewhere
+        local = set(self.manager.running_bots)
+        held = await self.store.renew(local, self.worker_id, self.lease_ttl)
+        for bot_id in local - held:
+            logger.warning(f"Lost lease on bot {bot_id}, stopping it on {self.worker_id}")
+            await self.manager.detach_bot(bot_id)
+
+        desired = await self._load_running_bots()
+
+        # Bots stopped through another worker
+        await self._drop_stopped(held - desired.keys())
+        held &= desired.keys()
+
+        workers = await self.store.workers()
+        if self.worker_id not in workers:
+            workers.append(self.worker_id)
+        share = math.ceil(len(desired) / len(workers)) if desired else 0
+        owners = await self.store.owners(desired.keys())
+
+        # Hand one bot to a less loaded worker when we run more than our share
+        load = {worker_id: 0 for worker_id in workers}
+        for owner in owners.values():
+            if owner in load:
+                load[owner] += 1
+        if len(held) > share and min(load.values()) + 1 < len(held):
+            bot_id = sorted(held)[-1]
+            logger.info(f"Rebalancing bot {bot_id} away from {self.worker_id}")
+            await self.manager.detach_bot(bot_id)
+            await self.store.release(bot_id, self.worker_id)
+            held.discard(bot_id)
+
+        # Take over bots nobody holds (new, or their worker died) up to our share
+        acquired = []
+        for bot_id in sorted(desired.keys() - owners.keys() if self.takeover else ()):
+            if len(held) + len(acquired) >= share:
+                break
+            if await self.store.acquire(bot_id, self.worker_id, self.lease_ttl):
+                acquired.append(bot_id)
+        if not acquired:
+            return 0
+        
+        # Read their checkpointed positions in one query
+        try:
+            await self.manager.checkpointer.preload(desired[bot_id].id for bot_id in acquired)
+        except Exception as e:
+            logger.warning(f"Could not preload positions: {e}")
+        return await self._start_acquired({bot_id: desired[bot_id] for bot_id in acquired})
+
+    async def run(self):
+        try:
+            await self.resume()
+        except Exception as e:
+            logger.error(f"Resuming bots failed on {self.worker_id}: {e}")
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.error(f"Supervisor heartbeat failed on {self.worker_id}: {e}")
+
+    async def _listen(self):
+        """Drop bots as soon as the worker that stopped them says so"""
+        while True:
+            try:
+                await self.transport.subscribe(settings.BOT_STOP_CHANNEL)
+                async for _, bot_id in self.transport.listen():
+                    if self.manager.is_bot_running(bot_id):
+                        await self._drop_stopped({bot_id})
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Bot stop listener failed on {self.worker_id}: {e}")
+                await asyncio.sleep(1.0)
+
+    def start(self):
+        if isinstance(self.store, InMemoryLeaseStore):
+            # Process-local leases cannot keep several workers from resuming the same bots
+            if int(os.environ.get("WEB_CONCURRENCY") or 1) > 1:
+                self.takeover = False
+                logger.error(
+                    "BOT_LEASE_BACKEND=memory with several workers (WEB_CONCURRENCY): not resuming "
+                    "RUNNING bots, every worker would trade them. Use the redis or postgres backend."
+                )
+            else:
+                logger.warning(
+                    "BOT_LEASE_BACKEND=memory resumes every RUNNING bot in this process; run a single "
+                    "worker, or use the redis or postgres backend with uvicorn --workers."
+                )
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        if self.transport is not None and (self._listener is None or self._listener.done()):
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        """Stop local bots and give up their leases so other workers take them over"""
+        for task in (self._task, self._listener):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = None
+        self._listener = None
+
+        held = list(self.manager.running_bots)
+        await self.manager.stop_all_bots()
+        for bot_id in held:
+            await self.store.release(bot_id, self.worker_id)
+        await self.store.remove_worker(self.worker_id)
+        await self.store.close()
+        if self.transport is not None:
+            await self.transport.close()
+
+
+bot_supervisor = BotSupervisor(bot_manager)
@@ -0,0 +1,269 @@
+import time
+import logging
+from abc import ABC, abstractmethod
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.config import settings
+from app.db.utils import default_session_factory
+from app.models import BotLease, WorkerHeartbeat
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseStore(ABC):
+    """Shared record of which worker runs which bot.
+
+    A lease is owned by one worker until it expires; the owner keeps it alive
+    by renewing it on every heartbeat. Workers register themselves the same
+    way so the supervisor knows how many are alive when sharing out bots.
+    """
+
+    @abstractmethod
+    async def acquire(self, bot_id: str, owner: str, ttl: float) -> bool:
+        """Take the lease if it is free, expired or already ours"""
+
+    @abstractmethod
+    async def renew(self, bot_ids: Iterable[str], owner: str, ttl: float) -> Set[str]:
+        """Extend leases still held by owner, returning the ones renewed"""
+
+    @abstractmethod
+    async def release(self, bot_id: str, owner: str):
+        ...
+
+    @abstractmethod
+    async def owners(self, bot_ids: Iterable[str]) -> Dict[str, str]:
+        """Current owner of every bot with an unexpired lease"""
+
+    @abstractmethod
+    async def heartbeat(self, worker_id: str, ttl: float):
+        ...
+
+    @abstractmethod
+    async def workers(self) -> List[str]:
+        """Workers whose heartbeat has not expired"""
+
+    @abstractmethod
+    async def remove_worker(self, worker_id: str):
+        ...
+
+    async def owner(self, bot_id: str) -> Optional[str]:
+        return (await self.owners([bot_id])).get(bot_id)
+
+    async def close(self):
+        pass
+
+
+class InMemoryLeaseStore(LeaseStore):
+    """Process-local leases, for single-process deployments and tests.
+
+    Several supervisors sharing one instance behave like separate workers
+    sharing Redis or Postgres. clock can be replaced to expire leases in tests.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.leases: Dict[str, tuple] = {}
+        self.heartbeats: Dict[str, float] = {}
+
+    def _live_owner(self, bot_id: str) -> Optional[str]:
+        lease = self.leases.get(bot_id)
+        if lease and lease[1] > self.clock():
+            return lease[0]
+        return None
+
+    async def acquire(self, bot_id: str, owner: str, ttl: float) -> bool:
+        current = self._live_owner(bot_id)
+        if current is not None and current != owner:
+            return False
+        self.leases[bot_id] = (owner, self.clock() + ttl)
+        return True
+
+    async def renew(self, bot_ids: Iterable[str], owner: str, ttl: float) -> Set[str]:
+        renewed = set()
+        for bot_id in bot_ids:
+            if self._live_owner(bot_id) == owner:
+                self.leases[bot_id] = (owner, self.clock() + ttl)
+                renewed.add(bot_id)
+        return renewed
+
+    async def release(self, bot_id: str, owner: str):
+        lease = self.leases.get(bot_id)
+        if lease and lease[0] == owner:
+            del self.leases[bot_id]
+
+    async def owners(self, bot_ids: Iterable[str]) -> Dict[str, str]:
+        result = {}
+        for bot_id in bot_ids:
+            owner = self._live_owner(bot_id)
+            if owner is not None:
+                result[bot_id] = owner
+        return result
+
+    async def heartbeat(self, worker_id: str, ttl: float):
+        self.heartbeats[worker_id] = self.clock() + ttl
+
+    async def workers(self) -> List[str]:
+        now = self.clock()
+        return sorted(worker_id for worker_id, expires in self.heartbeats.items() if expires > now)
+
+    async def remove_worker(self, worker_id: str):
+        self.heartbeats.pop(worker_id, None)
+
+
+class RedisLeaseStore(LeaseStore):
+    """Leases as Redis keys with a TTL; workers in a sorted set scored by expiry"""
+
+    # Only the owner may extend or delete a lease
+    RENEW_SCRIPT = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+    RELEASE_SCRIPT = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, url: Optional[str] = None, prefix: str = "tradebuddy"):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url or settings.REDIS_URL, decode_responses=True)
+        self.prefix = prefix
+        self.workers_key = f"{prefix}:workers"
+        self._renew = self.redis.register_script(self.RENEW_SCRIPT)
+        self._release = self.redis.register_script(self.RELEASE_SCRIPT)
+
+    def _key(self, bot_id: str) -> str:
+        return f"{self.prefix}:lease:{bot_id}"
+
+    async def acquire(self, bot_id: str, owner: str, ttl: float) -> bool:
+        key = self._key(bot_id)
+        if await self.redis.set(key, owner, nx=True, px=int(ttl * 1000)):
+            return True
+        # Re-acquiring our own lease just extends it
+        return bool(await self._renew(keys=[key], args=[owner, int(ttl * 1000)]))
+
+    async def renew(self, bot_ids: Iterable[str], owner: str, ttl: float) -> Set[str]:
+        bot_ids = list(bot_ids)
+        if not bot_ids:
+            return set()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for bot_id in bot_ids:
+                await self._renew(keys=[self._key(bot_id)], args=[owner, int(ttl * 1000)], client=pipe)
+            results = await pipe.execute()
+        return {bot_id for bot_id, ok in zip(bot_ids, results) if ok}
+
+    async def release(self, bot_id: str, owner: str):
+        await self._release(keys=[self._key(bot_id)], args=[owner])
+
+    async def owners(self, bot_ids: Iterable[str]) -> Dict[str, str]:
+        bot_ids = list(bot_ids)
+        if not bot_ids:
+            return {}
+        values = await self.redis.mget([self._key(bot_id) for bot_id in bot_ids])
+        return {bot_id: owner for bot_id, owner in zip(bot_ids, values) if owner}
+
+    async def heartbeat(self, worker_id: str, ttl: float):
+        await self.redis.zadd(self.workers_key, {worker_id: time.time() + ttl})
+
+    async def workers(self) -> List[str]:
+        await self.redis.zremrangebyscore(self.workers_key, "-inf", time.time())
+        return sorted(await self.redis.zrange(self.workers_key, 0, -1))
+
+    async def remove_worker(self, worker_id: str):
+        await self.redis.zrem(self.workers_key, worker_id)
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+class PostgresLeaseStore(LeaseStore):
+    """Leases in the bot_leases table, timed by the database clock"""
+
+    def __init__(self, session_factory=None):
+        self.session_factory = default_session_factory(session_factory)
+
+    async def acquire(self, bot_id: str, owner: str, ttl: float) -> bool:
+        expires_at = func.now() + timedelta(seconds=ttl)
+        stmt = insert(BotLease).values(bot_uuid=bot_id, owner=owner, expires_at=expires_at)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[BotLease.bot_uuid],
+            set_={"owner": owner, "expires_at": expires_at},
+            where=or_(BotLease.owner == owner, BotLease.expires_at < func.now()),
+        ).returning(BotLease.owner)
+        async with self.session_factory() as db:
+            result = await db.execute(stmt)
+            await db.commit()
+            return result.scalar_one_or_none() == owner
+
+    async def renew(self, bot_ids: Iterable[str], owner: str, ttl: float) -> Set[str]:
+        bot_ids = list(bot_ids)
+        if not bot_ids:
+            return set()
+        stmt = update(BotLease).where(
+            BotLease.bot_uuid.in_(bot_ids),
+            BotLease.owner == owner,
+            BotLease.expires_at > func.now(),
+        ).values(expires_at=func.now() + timedelta(seconds=ttl)).returning(BotLease.bot_uuid)
+        async with self.session_factory() as db:
+            result = await db.execute(stmt)
+            await db.commit()
+            return set(result.scalars().all())
+
+    async def release(self, bot_id: str, owner: str):
+        async with self.session_factory() as db:
+            await db.execute(delete(BotLease).where(BotLease.bot_uuid == bot_id, BotLease.owner == owner))
+            await db.commit()
+
+    async def owners(self, bot_ids: Iterable[str]) -> Dict[str, str]:
+        bot_ids = list(bot_ids)
+        if not bot_ids:
+            return {}
+        query = select(BotLease.bot_uuid, BotLease.owner).where(
+            BotLease.bot_uuid.in_(bot_ids),
+            BotLease.expires_at > func.now(),
+        )
+        async with self.session_factory() as db:
+            result = await db.execute(query)
+            return {bot_id: owner for bot_id, owner in result.all()}
+
+    async def heartbeat(self, worker_id: str, ttl: float):
+        expires_at = func.now() + timedelta(seconds=ttl)
+        stmt = insert(WorkerHeartbeat).values(worker_id=worker_id, expires_at=expires_at)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[WorkerHeartbeat.worker_id],
+            set_={"expires_at": expires_at},
+        )
+        async with self.session_factory() as db:
+            await db.execute(stmt)
+            await db.commit()
+
+    async def workers(self) -> List[str]:
+        query = select(WorkerHeartbeat.worker_id).where(WorkerHeartbeat.expires_at > func.now())
+        async with self.session_factory() as db:
+            result = await db.execute(query)
+            return sorted(result.scalars().all())
+
+    async def remove_worker(self, worker_id: str):
+        async with self.session_factory() as db:
+            await db.execute(delete(WorkerHeartbeat).where(WorkerHeartbeat.worker_id == worker_id))
+            await db.commit()
+
+
+def create_lease_store(backend: Optional[str] = None) -> LeaseStore:
+    """Lease store for BOT_LEASE_BACKEND ("memory", "redis" or "postgres")"""
+    backend = backend or settings.BOT_LEASE_BACKEND
+    if backend == "redis":
+        return RedisLeaseStore()
+    if backend == "postgres":
+        return PostgresLeaseStore()
+    if backend != "memory":
+        logger.warning(f"Unknown lease backend {backend}, using in-memory leases")
+    return InMemoryLeaseStore()
@@ -0,0 +1,18 @@
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Subscription, SubscriptionTier
+
+
+async def get_subscription_tier(db: AsyncSession, user_id: int) -> Optional[SubscriptionTier]:
+    """Get the tier of a user's active subscription (the latest if several are active)"""
+    query = select(SubscriptionTier).join(
+        Subscription, Subscription.tier_id == SubscriptionTier.id
+    ).where(
+        Subscription.user_id == user_id,
+        Subscription.is_active == True
+    ).order_by(Subscription.id.desc()).limit(1)
+    result = await db.execute(query)
+    return result.scalars().first()
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class AccountBalance:
+    """Cached margin balance of one account"""
+
+    __slots__ = ("free", "used", "total", "fetched_at")
+
+    def __init__(self, free: float, used: float, total: float):
+        self.free = free
+        self.used = used
+        self.total = total
+        self.fetched_at = time.monotonic()
+
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+
+class AccountStateService:
+    """Account state shared by every bot trading on the same API key.
+
+    Balances are cached per account key for a short TTL and shared between
+    concurrent readers; the engine invalidates an account after its own fills
+    so the next read reflects them. Leverage and margin mode applied per
+    (account, symbol) are remembered so they are only set when they change.
+    """
+
+    def __init__(self, balance_ttl: Optional[float] = None, currency: str = "USDT"):
+        self.balance_ttl = balance_ttl if balance_ttl is not None else settings.ACCOUNT_BALANCE_TTL
+        self.currency = currency
+        self.balances: Dict[str, AccountBalance] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.leverage_settings: Dict[Tuple[str, str], Tuple[Optional[int], Optional[str]]] = {}
+        self._leverage_locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self._reconciled: Set[Tuple[str, str]] = set()
+        self._reconcile_lock = asyncio.Lock()
+
+    async def get_balance(self, account_key: str, exchange,
+                          max_age: Optional[float] = None) -> Optional[AccountBalance]:
+        """Get swap account balance, fetching it through exchange when stale"""
+        if max_age is None:
+            max_age = self.balance_ttl
+
+        cached = self.balances.get(account_key)
+        if cached and cached.age() <= max_age:
+            return cached
+
+        inflight = self._inflight.get(account_key)
+        if inflight:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[account_key] = future
+        try:
+            balance = await exchange.fetch_balance({'type': 'swap'})
+            currency = balance.get(self.currency) or {}
+            cached = AccountBalance(
+                free=currency.get('free') or 0.0,
+                used=currency.get('used') or 0.0,
+                total=currency.get('total') or 0.0,
+            )
+            self.balances[account_key] = cached
+            future.set_result(cached)
+            return cached
+        except Exception as e:
+            logger.error(f"Error fetching balance for {account_key}: {e}")
+            future.set_result(None)
+            return None
+        finally:
+            if not future.done():
+                future.set_result(None)
+            del self._inflight[account_key]
+
+    def invalidate(self, account_key: str):
+        """Drop cached balance after a fill on the account"""
+        self.balances.pop(account_key, None)
+
+    async def reconcile(self, account_key: str, exchange, symbols: List[str]):
+        """Load applied leverage and margin mode from one bulk positions query"""
+        async with self._reconcile_lock:
+            pending = [symbol for symbol in symbols if (account_key, symbol) not in self._reconciled]
+            if not pending:
+                return
+            try:
+                positions = await exchange.fetch_positions(pending)
+            except Exception as e:
+                logger.warning(f"Could not reconcile leverage for {account_key}: {e}")
+                return
+            for position in positions:
+                symbol = position.get('symbol')
+                if symbol:
+                    leverage = position.get('leverage')
+                    self.leverage_settings[(account_key, symbol)] = (
+                        int(leverage) if leverage else None,
+                        position.get('marginMode'),
+                    )
+            self._reconciled.update((account_key, symbol) for symbol in pending)
+
+    async def ensure_leverage(self, account_key: str, exchange, symbol: str,
+                              leverage: int, margin_mode: str = 'cross') -> bool:
+        """Apply leverage and margin mode unless already in effect, True if a call was made"""
+        key = (account_key, symbol)
+        if self.leverage_settings.get(key) == (leverage, margin_mode):
+            return False
+
+        lock = self._leverage_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            current_leverage, current_mode = self.leverage_settings.get(key, (None, None))
+            if (current_leverage, current_mode) == (leverage, margin_mode):
+                return False
+            # Only switch margin mode when it is known to differ
+            if current_mode and current_mode != margin_mode:
+                await exchange.set_margin_mode(margin_mode, symbol)
+            if current_leverage != leverage or current_mode != margin_mode:
+                await exchange.set_leverage(leverage, symbol, {'marginMode': margin_mode})
+            self.leverage_settings[key] = (leverage, margin_mode)
+            return True
+
+    def forget_account(self, account_key: str):
+        """Drop everything cached for an account, e.g. after its credentials change"""
+        self.balances.pop(account_key, None)
+        self._reconciled = {key for key in self._reconciled if key[0] != account_key}
+        for key in [key for key in self.leverage_settings if key[0] == account_key]:
+            del self.leverage_settings[key]
+            self._leverage_locks.pop(key, None)
+
+    def clear(self):
+        self.balances.clear()
+        self.leverage_settings.clear()
+        self._leverage_locks.clear()
+        self._reconciled.clear()
@@ -0,0 +1,342 @@
+import time
+import logging
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import ccxt.async_support as ccxt
+
+from app.models import BotConfig
+from app.trading.markets import MarketInfo, ladder_sizes
+
+logger = logging.getLogger(__name__)
+
+# Candles scanned per vectorized search step; grows while no event is found
+SEARCH_CHUNK = 1024
+
+
+class BacktestParams:
+    """Strategy parameters replayed by the backtester (mirrors BotConfig)"""
+
+    __slots__ = (
+        "leverage",
+        "take_profit_pct",
+        "martingale_trigger_pct",
+        "martingale_sequence",
+        "fee_rate",
+        "initial_balance",
+    )
+
+    def __init__(self, leverage: int = 25, take_profit_pct: float = 0.56,
+                 martingale_trigger_pct: float = 1.1,
+                 martingale_sequence: Sequence[float] = (0.20, 0.27, 0.36, 0.47, 0.63, 0.83, 1.08, 1.43, 1.88, 2.47, 3.25),
+                 fee_rate: float = 0.0006, initial_balance: Optional[float] = None):
+        self.leverage = leverage
+        self.take_profit_pct = take_profit_pct
+        self.martingale_trigger_pct = martingale_trigger_pct
+        self.martingale_sequence = list(martingale_sequence)
+        self.fee_rate = fee_rate
+        # Default to the margin needed to fill the whole ladder
+        self.initial_balance = initial_balance if initial_balance is not None else sum(self.martingale_sequence)
+
+    @classmethod
+    def from_config(cls, config: BotConfig, **overrides) -> "BacktestParams":
+        params = {
+            "leverage": config.leverage,
+            "take_profit_pct": config.take_profit_pct,
+            "martingale_trigger_pct": config.martingale_trigger_pct,
+            "martingale_sequence": config.martingale_sequence,
+        }
+        params.update(overrides)
+        return cls(**params)
+
+
+class BacktestResult:
+    """Summary of one backtest run"""
+
+    __slots__ = (
+        "total_pnl",
+        "total_return_pct",
+        "max_drawdown",
+        "max_drawdown_pct",
+        "cycles",
+        "deepest_level",
+        "level_counts",
+        "fees",
+        "open_position",
+        "liquidated",
+        "aborted",
+        "candles",
+        "elapsed",
+    )
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def position_size(margin: float, leverage: int, price: float, market: Optional[MarketInfo] = None) -> float:
+    """Amount TradingBot orders for one level (see TradingBot.calculate_position_size)"""
+    return float(ladder_sizes([margin], leverage, price, market)[0])
+
+
+def _first_hit(high: np.ndarray, low: np.ndarray, start: int, tp_price: float,
+               trigger_price: float) -> int:
+    """Index of the first candle >= start touching TP or the martingale trigger, -1 if none"""
+    n = len(high)
+    chunk = SEARCH_CHUNK
+    while start < n:
+        end = min(start + chunk, n)
+        hit = (low[start:end] <= trigger_price) | (high[start:end] >= tp_price)
+        if hit.any():
+            return start + int(hit.argmax())
+        start = end
+        chunk *= 2
+    return -1
+
+
+def _first_drawdown(low: np.ndarray, start: int, end: int, offset: float, contracts: float,
+                    peak: float, limit: float):
+    """First candle in [start, end) where equity, offset + contracts * low, is more than
+    limit below its running peak; returns (index or -1, peak over the candles scanned)"""
+    chunk = SEARCH_CHUNK
+    while start < end:
+        stop = min(start + chunk, end)
+        equity = offset + contracts * low[start:stop]
+        running = np.maximum.accumulate(np.maximum(equity, peak))
+        hit = running - equity > limit
+        if hit.any():
+            k = int(hit.argmax())
+            return start + k, float(running[k])
+        peak = float(running[-1])
+        start = stop
+        chunk *= 2
+    return -1, peak
+
+
+def _as_arrays(ohlcv):
+    """Accept a DataFrame with open/high/low/close columns or a ccxt OHLCV list/array"""
+    if isinstance(ohlcv, pd.DataFrame):
+        return (ohlcv["open"].to_numpy(dtype=float), ohlcv["high"].to_numpy(dtype=float),
+                ohlcv["low"].to_numpy(dtype=float), ohlcv["close"].to_numpy(dtype=float))
+    data = np.asarray(ohlcv, dtype=float)
+    return data[:, 1], data[:, 2], data[:, 3], data[:, 4]
+
+
+def run_backtest(ohlcv, params: BacktestParams, stop_drawdown_pct: Optional[float] = None,
+                 market: Optional[MarketInfo] = None) -> BacktestResult:
+    """Replay the TradingBot martingale cycle over OHLCV candles.
+
+    Rather than stepping candle by candle, each position state jumps straight
+    to the next candle that touches its take-profit or next trigger price with
+    a vectorized search. Within one candle the adverse move is assumed to come
+    first: triggers fill before take-profit, and take-profit is only checked
+    from the following candle after a martingale fill. Fills at trigger and TP
+    prices use the candle open instead when it gapped through them. Orders
+    are sized like TradingBot's, to the amount step and minimums of market
+    when its metadata is given.
+
+    Equity is marked to market at every candle low. The position is
+    liquidated at the first candle whose low takes equity to zero (before a
+    trigger further down would fill); the replay stops there with the whole
+    balance lost. stop_drawdown_pct aborts the run at the first candle where
+    that equity curve is more than this percentage of the initial balance
+    below its peak; the optimizer uses this to prune ruinous configurations
+    early.
+    """
+    started = time.perf_counter()
+    open_, high, low, close = _as_arrays(ohlcv)
+    n = len(close)
+
+    sequence = params.martingale_sequence
+    max_step = len(sequence) - 1
+    tp_factor = 1 + params.take_profit_pct / 100
+    trigger_factor = 1 - params.martingale_trigger_pct / 100
+    fee_rate = params.fee_rate
+
+    # Position state changes: candle index and state after the change
+    change_idx: List[int] = []
+    change_contracts: List[float] = []
+    change_cost: List[float] = []
+    change_realized: List[float] = []
+
+    realized = 0.0
+    fees = 0.0
+    cycles = 0
+    deepest = 0
+    level_counts = [0] * len(sequence)
+    aborted = False
+    liquidated = False
+    peak_equity = params.initial_balance
+    stop_drawdown = (
+        stop_drawdown_pct / 100 * params.initial_balance if stop_drawdown_pct is not None else None
+    )
+
+    i = 0
+    contracts = 0.0
+    cost = 0.0
+    step = 0
+    while i < n:
+        # Open a new cycle at the close of candle i
+        price = close[i]
+        amount = position_size(sequence[0], params.leverage, price, market)
+        contracts = amount
+        cost = price * amount
+        fee = cost * fee_rate
+        fees += fee
+        realized -= fee
+        step = 0
+        reference = price
+        deepest = max(deepest, 1)
+        change_idx.append(i)
+        change_contracts.append(contracts)
+        change_cost.append(cost)
+        change_realized.append(realized)
+
+        start = i + 1
+        # First candle whose equity is marked with the current position
+        marked_from = i
+        closed = False
+        while start < n:
+            tp_price = cost / contracts * tp_factor
+            trigger_price = reference * trigger_factor if step < max_step else -np.inf
+            # Price at which equity (cross margin on the whole balance) reaches zero
+            liquidation_price = (cost - params.initial_balance - realized) / contracts
+            j = _first_hit(high, low, start, tp_price, max(trigger_price, liquidation_price))
+            if stop_drawdown is not None:
+                k, peak_equity = _first_drawdown(
+                    low, marked_from, j if j >= 0 else n, params.initial_balance + realized - cost,
+                    contracts, peak_equity, stop_drawdown,
+                )
+                if k >= 0:
+                    aborted = True
+                    change_idx.append(k)
+                    change_contracts.append(contracts)
+                    change_cost.append(cost)
+                    change_realized.append(realized)
+                    break
+            if j < 0:
+                start = n
+                break
+
+            if low[j] <= max(trigger_price, liquidation_price):
+                # Add levels, several if the candle fell through more than one trigger,
+                # unless equity runs out before the next one fills
+                while True:
+                    liquidation_price = (cost - params.initial_balance - realized) / contracts
+                    if low[j] <= liquidation_price and liquidation_price >= trigger_price:
+                        liquidated = True
+                        break
+                    if step >= max_step or low[j] > trigger_price:
+                        break
+                    fill = min(open_[j], trigger_price)
+                    step += 1
+                    amount = position_size(sequence[step], params.leverage, fill, market)
+                    contracts += amount
+                    cost += fill * amount
+                    fee = fill * amount * fee_rate
+                    fees += fee
+                    realized -= fee
+                    reference = fill
+                    trigger_price = reference * trigger_factor if step < max_step else -np.inf
+                    deepest = max(deepest, step + 1)
+                if liquidated:
+                    # The position is gone and so is the balance
+                    realized = -params.initial_balance
+                    contracts = 0.0
+                    cost = 0.0
+                change_idx.append(j)
+                change_contracts.append(contracts)
+                change_cost.append(cost)
+                change_realized.append(realized)
+                if liquidated:
+                    break
+                start = j + 1
+                marked_from = j
+                continue
+
+            # Take profit
+            exit_price = max(open_[j], tp_price)
+            pnl = contracts * exit_price - cost
+            fee = contracts * exit_price * fee_rate
+            fees += fee
+            realized += pnl - fee
+            cycles += 1
+            level_counts[step] += 1
+            contracts = 0.0
+            cost = 0.0
+            change_idx.append(j)
+            change_contracts.append(0.0)
+            change_cost.append(0.0)
+            change_realized.append(realized)
+            i = j
+            closed = True
+            break
+
+        if aborted or liquidated or not closed:
+            break
+
+    # Mark-to-market equity at every candle low from the state change log
+    idx = np.asarray(change_idx)
+    state = np.searchsorted(idx, np.arange(n), side="right") - 1
+    valid = state >= 0
+    state = np.where(valid, state, 0)
+    position_contracts = np.where(valid, np.asarray(change_contracts)[state], 0.0)
+    position_cost = np.where(valid, np.asarray(change_cost)[state], 0.0)
+    realized_curve = np.where(valid, np.asarray(change_realized)[state], 0.0)
+    equity = params.initial_balance + realized_curve + position_contracts * low - position_cost
+    if aborted or liquidated:
+        equity = equity[:change_idx[-1] + 1]
+
+    peak = np.maximum.accumulate(np.maximum(equity, params.initial_balance))
+    drawdown = peak - equity
+    max_dd_at = int(drawdown.argmax()) if len(drawdown) else 0
+    max_drawdown = float(drawdown[max_dd_at]) if len(drawdown) else 0.0
+    max_drawdown_pct = float(max_drawdown / peak[max_dd_at] * 100) if len(drawdown) else 0.0
+
+    final_equity = float(equity[-1]) if len(equity) else params.initial_balance
+    total_pnl = final_equity - params.initial_balance
+
+    return BacktestResult(
+        total_pnl=total_pnl,
+        total_return_pct=total_pnl / params.initial_balance * 100,
+        max_drawdown=max_drawdown,
+        max_drawdown_pct=max_drawdown_pct,
+        cycles=cycles,
+        deepest_level=deepest,
+        level_counts=level_counts,
+        fees=float(fees),
+        open_position=bool(contracts > 0),
+        liquidated=liquidated or bool(len(equity) and equity.min() <= 0),
+        aborted=aborted,
+        candles=n,
+        elapsed=time.perf_counter() - started,
+    )
+
+
+async def load_ohlcv(exchange_id: str, symbol: str, timeframe: str, since: int,
+                     until: Optional[int] = None, sandbox: bool = False,
+                     limit: int = 1000) -> pd.DataFrame:
+    """Page through exchange OHLCV history into a DataFrame"""
+    exchange = getattr(ccxt, exchange_id)({'sandbox': sandbox, 'enableRateLimit': True})
+    until = until or exchange.milliseconds()
+    rows = []
+    try:
+        while since < until:
+            batch = await exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=limit)
+            if not batch:
+                break
+            rows.extend(batch)
+            next_since = batch[-1][0] + 1
+            if next_since <= since:
+                break
+            since = next_since
+    finally:
+        await exchange.close()
+
+    frame = pd.DataFrame(rows, columns=["timestamp", "open", "high", "low", "close", "volume"])
+    frame = frame.drop_duplicates("timestamp")
+    return frame[frame["timestamp"] < until].reset_index(drop=True)
@@ -1,124 +1,284 @@
-import ccxt
 import asyncio
 import logging
+import time
 from typing import Dict, List, Optional
 from decimal import Decimal
 from datetime import datetime
 
-from app.models import Bot, BotConfig, BotPosition
-from app.core.websocket import websocket_manager
+from app.models import Bot, BotConfig, TradingMode
+from app.core.config import settings
+from app.core.websocket import BOT_ERROR, websocket_manager
+from app.trading.account_state import AccountStateService
+from app.trading.cadence import PollCadence
+from app.trading.checkpoint import PositionCheckpointer, position_row
+from app.trading.exchange_pool import exchange_pool
+from app.trading.ledger import TradeLedger, trade_row
+from app.trading.market_data import MarketDataHub
+from app.trading.markets import ladder_sizes, market_metadata
+from app.trading.paper_exchange import PaperExchange
+from app.trading.rate_limiter import request_scheduler
+from app.trading.state import SymbolState
 
 
 class TradingBot:
     """Trading bot engine based on original martingale strategy"""
     
-    def __init__(self, bot: Bot, config: BotConfig, exchange_credentials: dict):
+    def __init__(self, bot: Bot, config: BotConfig, exchange_credentials: dict,
+                 market_data: Optional[MarketDataHub] = None,
+                 account_state: Optional[AccountStateService] = None,
+                 account_key: Optional[str] = None,
+                 calls_per_minute: Optional[int] = None,
+                 checkpointer: Optional[PositionCheckpointer] = None,
+                 trade_ledger: Optional[TradeLedger] = None):
         self.bot = bot
         self.config = config
         self.logger = logging.getLogger(f"Bot-{bot.uuid}")
         
-        # Initialize exchange
+        self.sandbox = exchange_credentials.get('sandbox', True)
+        
+        # Shared market data (falls back to a private hub when run standalone)
+        self.market_data = market_data or MarketDataHub()
+        
+        # Balance cache shared by bots on the same API key
+        self.account_state = account_state or AccountStateService()
+        self.account_key = account_key or f"bot:{bot.uuid}"
+        
+        # Write-behind persistence of symbol state (none when run standalone)
+        self.checkpointer = checkpointer
+        self.trade_ledger = trade_ledger
+        
+        # Initialize exchange (request budget from the user's subscription tier)
+        self.calls_per_minute = calls_per_minute
         self.exchange = self._init_exchange(exchange_credentials)
         
         # Trading state
-        self.trades = {}
-        for symbol in bot.symbols:
-            self.trades[symbol] = {
-                'current_step': 0,
-                'entry_price': None,
-                'position_side': None,
-                'is_active': False,
-                'position_levels': [],
-                'martingale_trigger_prices': [],
-                'trade_in_progress': False,
-            }
+        self.trades: Dict[str, SymbolState] = {symbol: SymbolState() for symbol in bot.symbols}
         
         self.is_running = False
+        # Set by stop() to end waits early so the loop exits at its next wait
+        self._stopped = asyncio.Event()
+        self.poll_interval = settings.BOT_POLL_INTERVAL
+        # When each active symbol is checked next, from distance to its levels
+        self.cadence = PollCadence(self.poll_interval)
+        self._last_balance_check = 0.0
         
     def _init_exchange(self, credentials: dict):
         """Initialize exchange connection"""
-        return ccxt.bitget({
-            'apiKey': credentials.get('api_key'),
-            'secret': credentials.get('secret'),
-            'password': credentials.get('passphrase'),
-            'sandbox': credentials.get('sandbox', True),
-            'enableRateLimit': True,
-        })
+        if self.bot.mode == TradingMode.PAPER:
+            return PaperExchange(self.market_data, self.bot.exchange, self.sandbox)
+            
+        # Warm client shared with other bots and endpoints on the same credentials
+        return exchange_pool.acquire(self.bot.exchange, credentials, self.calls_per_minute)
         
     async def start(self):
         """Start the trading bot"""
         self.is_running = True
         self.logger.info(f"Starting bot {self.bot.uuid}")
         
+        # Share process-wide market metadata instead of loading markets per client
+        await market_metadata.load(self.bot.exchange, self.sandbox)
+        market_metadata.apply(self.exchange, self.bot.exchange, self.sandbox)
+        
+        # Learn leverage and margin mode already applied on the account
+        await self.account_state.reconcile(self.account_key, self.exchange, self.bot.symbols)
+        
+        # Continue open martingale cycles from the last checkpoint
+        await self.restore_state()
+        for symbol in self.bot.symbols:
+            if not self.trades[symbol].is_active:
+                self.schedule_check(symbol)
+        
         while self.is_running:
             try:
-                # Check balance
-                balance = await self.get_balance()
-                if balance < 15.0:  # Minimum required
-                    await self.send_notification("error", "Insufficient balance")
-                    break
+                # Check balance (at poll cadence, not on every pushed tick)
+                now = time.monotonic()
+                if now - self._last_balance_check >= self.current_poll_interval():
+                    self._last_balance_check = now
+                    balance = await self.get_balance()
+                    if balance < 15.0:  # Minimum required
+                        await self.send_notification(BOT_ERROR, "Insufficient balance")
+                        break
+                
+                # Snapshot prices once per tick so every decision sees the same price.
+                # Pushed ticks cost nothing, polled symbols are checked when due.
+                active_symbols = [s for s in self.bot.symbols if self.trades[s].is_active]
+                if self.market_data.is_streaming:
+                    due_symbols = active_symbols
+                else:
+                    due_symbols = self.cadence.due(active_symbols)
+                prices = await self.get_prices(due_symbols)
                 
                 # Monitor active positions
-                for symbol in self.bot.symbols:
-                    trade = self.trades[symbol]
+                for symbol in due_symbols:
+                    current_price = prices.get(symbol)
+                    if not current_price:
+                        continue
+                    self.checkpoint(symbol, current_price)
+                    self.schedule_check(symbol, current_price)
+                    # Live price and PnL for the UI (coalesced by the connection manager)
+                    await self.send_notification("position_update", self.position_update(symbol, current_price))
+                    
+                    # Check take profit
+                    if self.check_take_profit(symbol, current_price):
+                        await self.close_position(symbol, current_price)
+                        continue
                     
-                    if trade['is_active']:
-                        # Check take profit
-                        if await self.check_take_profit(symbol):
-                            await self.close_position(symbol)
-                            continue
-                        
-                        # Check martingale
-                        if await self.should_add_to_position(symbol):
-                            current_price = await self.get_current_price(symbol)
-                            if current_price:
-                                await self.add_martingale_level(symbol, current_price)
+                    # Check martingale
+                    if self.should_add_to_position(symbol, current_price):
+                        await self.add_martingale_level(symbol, current_price)
                     
-                # Start new trades if slots available
-                active_count = sum(1 for t in self.trades.values() if t['is_active'])
-                if active_count < self.config.max_positions:
+                # Start new trades if slots available (not once stopping)
+                active_count = sum(1 for t in self.trades.values() if t.is_active)
+                if self.is_running and active_count < self.config.max_positions:
                     available_symbol = self.get_available_symbol()
                     if available_symbol:
                         await self.start_new_cycle(available_symbol)
                 
-                await asyncio.sleep(5)
+                await self.wait_for_tick()
                 
             except Exception as e:
                 self.logger.error(f"Error in bot loop: {e}")
-                await self.send_notification("error", str(e))
-                await asyncio.sleep(10)
+                await self.send_notification(BOT_ERROR, str(e))
+                await self._idle(10)
+                
+    def position_update(self, symbol: str, current_price: float) -> dict:
+        """Price and PnL of an active symbol as reported to clients"""
+        trade = self.trades[symbol]
+        return {
+            "symbol": symbol,
+            "price": current_price,
+            "weighted_average_entry": trade.weighted_average_entry(),
+            "unrealized_pnl": trade.unrealized_pnl(current_price),
+            "level": trade.current_step + 1,
+            "contracts": trade.total_contracts,
+        }
+        
+    def watched_levels(self, symbol: str) -> List[Optional[float]]:
+        """Take profit price and next martingale trigger price of an active symbol"""
+        trade = self.trades[symbol]
+        weighted_avg = trade.weighted_average_entry()
+        take_profit = weighted_avg * (1 + self.config.take_profit_pct / 100) if weighted_avg else None
+        next_trigger = None
+        reference_price = trade.reference_price()
+        if reference_price and trade.current_step < len(self.config.martingale_sequence) - 1:
+            next_trigger = reference_price * (1 - self.config.martingale_trigger_pct / 100)
+        return [take_profit, next_trigger]
+        
+    def schedule_check(self, symbol: str, current_price: Optional[float] = None):
+        """Plan the next check of a symbol and tell market data how fresh it must be"""
+        if not self.trades[symbol].is_active or not current_price:
+            self.cadence.forget(symbol)
+            interval = self.cadence.max_interval
+        else:
+            interval = self.cadence.observe(symbol, current_price, self.watched_levels(symbol))
+        self.market_data.request_max_age(
+            str(self.bot.uuid), self.bot.exchange, self.sandbox, symbol, interval
+        )
+        
+    def current_poll_interval(self) -> float:
+        """Poll interval stretched while the API key's request budget is backlogged"""
+        rate_key = getattr(self.exchange, 'rate_key', None)
+        if rate_key is None:
+            return self.poll_interval
+        return self.poll_interval * request_scheduler.stretch_factor(rate_key, self.poll_interval)
+        
+    async def wait_for_tick(self):
+        """Wait for the next pushed price update, or the poll interval as a fallback"""
+        interval = self.current_poll_interval()
+        if not self.market_data.is_streaming:
+            # Wake up early for the symbol due soonest
+            active_symbols = [s for s in self.bot.symbols if self.trades[s].is_active]
+            next_due = self.cadence.next_due(active_symbols)
+            if next_due is not None:
+                interval = min(interval, max(0.0, next_due - time.monotonic()))
+            await self._idle(interval)
+            return
+            
+        event = self.market_data.tick_event(str(self.bot.uuid))
+        try:
+            await asyncio.wait_for(event.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+        event.clear()
+        
+    async def _idle(self, seconds: float):
+        """Sleep that ends early when the bot is stopped"""
+        try:
+            await asyncio.wait_for(self._stopped.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+                
+    async def restore_state(self):
+        """Load persisted symbol state"""
+        if not self.checkpointer:
+            return
+        rows = await self.checkpointer.load(self.bot.id)
+        for symbol, row in rows.items():
+            trade = self.trades.get(symbol)
+            if trade is None:
+                continue
+            trade.restore(row)
+            if isinstance(self.exchange, PaperExchange):
+                # A paper exchange starts empty; give it the restored positions back
+                self.exchange.restore_position(
+                    symbol, trade.total_contracts if trade.is_active else 0.0, trade.total_cost,
+                    self.config.leverage, trade.realized_pnl
+                )
+            if trade.is_active:
+                self.logger.info(f"Restored {symbol} cycle at level {trade.current_step + 1}")
+                
+    def checkpoint(self, symbol: str, current_price: Optional[float] = None, urgent: bool = False):
+        """Queue symbol state for persistence (never waits on the database)"""
+        if self.checkpointer:
+            self.checkpointer.mark(
+                position_row(self.bot.id, symbol, self.trades[symbol], current_price), urgent
+            )
+                
+    async def record_trade(self, symbol: str, side: str, order: dict, price: float, quantity: float,
+                           pnl: float = 0.0, pnl_pct: float = 0.0):
+        """Publish a fill to the trade ledger (written in batches off the trading path)"""
+        if self.trade_ledger:
+            await self.trade_ledger.record(
+                trade_row(self.bot.id, symbol, side, order, price, quantity, pnl, pnl_pct)
+            )
                 
     async def stop(self):
-        """Stop the trading bot"""
+        """Stop the trading bot; the loop exits at its next wait, never mid-order"""
         self.is_running = False
+        self._stopped.set()
+        tick_event = self.market_data.tick_events.get(str(self.bot.uuid))
+        if tick_event is not None:
+            tick_event.set()
         self.logger.info(f"Stopping bot {self.bot.uuid}")
         
+    async def close(self):
+        """Release exchange client"""
+        if isinstance(self.exchange, PaperExchange):
+            await self.exchange.close()
+        else:
+            exchange_pool.release(self.exchange)
+        
     async def get_balance(self) -> float:
-        """Get USDT balance"""
-        try:
-            balance = self.exchange.fetch_balance({'type': 'swap'})
-            return balance['USDT']['free']
-        except Exception as e:
-            self.logger.error(f"Error fetching balance: {e}")
-            return 0
+        """Get free USDT balance from the shared account cache"""
+        balance = await self.account_state.get_balance(self.account_key, self.exchange)
+        return balance.free if balance else 0
             
-    async def get_current_price(self, symbol: str) -> Optional[float]:
-        """Get current price for symbol"""
-        try:
-            ticker = self.exchange.fetch_ticker(symbol)
-            return ticker['last']
-        except Exception as e:
-            self.logger.error(f"Error fetching price for {symbol}: {e}")
-            return None
+    async def get_current_price(self, symbol: str, max_age: Optional[float] = None) -> Optional[float]:
+        """Get current price for symbol, at most max_age seconds old (default: its requested cadence)"""
+        return await self.market_data.get_price(self.bot.exchange, self.sandbox, symbol, max_age)
+        
+    async def get_prices(self, symbols: List[str]) -> Dict[str, Optional[float]]:
+        """Get one price snapshot for several symbols"""
+        prices = await asyncio.gather(*(self.get_current_price(symbol) for symbol in symbols))
+        return dict(zip(symbols, prices))
             
-    async def check_take_profit(self, symbol: str) -> bool:
-        """Check if take profit should trigger"""
+    def check_take_profit(self, symbol: str, current_price: Optional[float]) -> bool:
+        """Check if take profit should trigger at the given price"""
         trade = self.trades[symbol]
-        if not trade['is_active']:
+        if not trade.is_active:
             return False
             
-        weighted_avg = self.calculate_weighted_average_entry(symbol)
-        current_price = await self.get_current_price(symbol)
+        weighted_avg = trade.weighted_average_entry()
         
         if not weighted_avg or not current_price:
             return False
@@ -126,21 +286,12 @@ class TradingBot:
         profit_pct = (current_price - weighted_avg) / weighted_avg * 100
         return profit_pct >= self.config.take_profit_pct
         
-    async def should_add_to_position(self, symbol: str) -> bool:
-        """Check if should add martingale level"""
-        trade = self.trades[symbol]
-        current_price = await self.get_current_price(symbol)
-        
+    def should_add_to_position(self, symbol: str, current_price: Optional[float]) -> bool:
+        """Check if should add martingale level at the given price"""
         if not current_price:
             return False
             
-        if trade['current_step'] == 0:
-            reference_price = trade['entry_price']
-        else:
-            if trade['martingale_trigger_prices']:
-                reference_price = trade['martingale_trigger_prices'][-1]
-            else:
-                reference_price = trade['entry_price']
+        reference_price = self.trades[symbol].reference_price()
         
         if not reference_price:
             return False
@@ -152,24 +303,29 @@ class TradingBot:
         """Start new trading cycle"""
         trade = self.trades[symbol]
         
-        if trade['trade_in_progress'] or trade['is_active']:
+        if trade.trade_in_progress or trade.is_active:
             return False
             
-        trade['trade_in_progress'] = True
+        trade.trade_in_progress = True
         
         try:
-            # Set leverage
-            self.exchange.set_leverage(self.config.leverage, symbol)
+            # Set leverage (skipped when already applied on this account)
+            await self.account_state.ensure_leverage(
+                self.account_key, self.exchange, symbol, self.config.leverage, 'cross'
+            )
             
-            price = await self.get_current_price(symbol)
+            # Idle symbols are only kept ADAPTIVE_POLL_MAX fresh; the entry price
+            # (and with it every level of the cycle) needs a current quote
+            price = await self.get_current_price(symbol, settings.MARKET_DATA_MAX_AGE)
             if not price:
-                trade['trade_in_progress'] = False
+                trade.trade_in_progress = False
                 return False
                 
-            amount = self.calculate_position_size(0, price)
+            # Later levels are sized at their actual trigger price when they fill
+            amount = self.calculate_position_size(0, price, symbol)
             
             # Place order
-            order = self.exchange.create_market_order(
+            order = await self.exchange.create_market_order(
                 symbol=symbol,
                 side='buy',
                 amount=amount,
@@ -177,17 +333,13 @@ class TradingBot:
             )
             
             if order:
-                trade['current_step'] = 0
-                trade['entry_price'] = price
-                trade['position_side'] = 'buy'
-                trade['is_active'] = True
-                trade['position_levels'] = [{
-                    'price': price,
-                    'margin': self.config.martingale_sequence[0],
-                    'contracts': amount,
-                    'level': 1
-                }]
-                trade['martingale_trigger_prices'] = []
+                # Prefer the exchange's average fill over the quoted price
+                price = order.get('average') or price
+                trade.open('buy', price, self.config.martingale_sequence[0], amount)
+                self.account_state.invalidate(self.account_key)
+                self.checkpoint(symbol, price, urgent=True)
+                self.schedule_check(symbol, price)
+                await self.record_trade(symbol, 'buy', order, price, amount)
                 
                 await self.send_notification("trade_opened", {
                     "symbol": symbol,
@@ -195,26 +347,26 @@ class TradingBot:
                     "amount": amount
                 })
                 
-                trade['trade_in_progress'] = False
+                trade.trade_in_progress = False
                 return True
                 
         except Exception as e:
             self.logger.error(f"Error starting new cycle: {e}")
-            trade['trade_in_progress'] = False
+            trade.trade_in_progress = False
             return False
             
     async def add_martingale_level(self, symbol: str, current_price: float):
         """Add martingale level"""
         trade = self.trades[symbol]
         
-        if trade['current_step'] >= len(self.config.martingale_sequence) - 1:
+        if trade.current_step >= len(self.config.martingale_sequence) - 1:
             return False
             
-        trade['current_step'] += 1
-        amount = self.calculate_position_size(trade['current_step'], current_price)
+        trade.current_step += 1
+        amount = self.calculate_position_size(trade.current_step, current_price, symbol)
         
         try:
-            order = self.exchange.create_market_order(
+            order = await self.exchange.create_market_order(
                 symbol=symbol,
                 side='buy',
                 amount=amount,
@@ -222,18 +374,18 @@ class TradingBot:
             )
             
             if order:
-                trade['martingale_trigger_prices'].append(current_price)
-                trade['position_levels'].append({
-                    'price': current_price,
-                    'margin': self.config.martingale_sequence[trade['current_step']],
-                    'contracts': amount,
-                    'level': trade['current_step'] + 1
-                })
+                fill_price = order.get('average') or current_price
+                trade.trigger_prices.append(current_price)
+                trade.add_level(fill_price, self.config.martingale_sequence[trade.current_step], amount)
+                self.account_state.invalidate(self.account_key)
+                self.checkpoint(symbol, fill_price, urgent=True)
+                self.schedule_check(symbol, fill_price)
+                await self.record_trade(symbol, 'buy', order, fill_price, amount)
                 
                 await self.send_notification("martingale_added", {
                     "symbol": symbol,
-                    "level": trade['current_step'] + 1,
-                    "price": current_price,
+                    "level": trade.current_step + 1,
+                    "price": fill_price,
                     "amount": amount
                 })
                 
@@ -241,21 +393,22 @@ class TradingBot:
                 
         except Exception as e:
             self.logger.error(f"Error adding martingale: {e}")
-            trade['current_step'] -= 1
+            trade.current_step -= 1
             return False
             
-    async def close_position(self, symbol: str):
+    async def close_position(self, symbol: str, current_price: Optional[float] = None):
         """Close position"""
         trade = self.trades[symbol]
         
-        if not trade['position_levels']:
+        if not trade.levels:
             return False
             
-        total_contracts = sum(level['contracts'] for level in trade['position_levels'])
-        current_price = await self.get_current_price(symbol)
+        total_contracts = trade.total_contracts
+        if current_price is None:
+            current_price = await self.get_current_price(symbol)
         
         try:
-            order = self.exchange.create_market_order(
+            order = await self.exchange.create_market_order(
                 symbol=symbol,
                 side='sell',
                 amount=total_contracts,
@@ -263,7 +416,9 @@ class TradingBot:
             )
             
             if order:
-                weighted_avg = self.calculate_weighted_average_entry(symbol)
+                current_price = order.get('average') or current_price
+                self.account_state.invalidate(self.account_key)
+                weighted_avg = trade.weighted_average_entry()
                 profit_pct = (current_price - weighted_avg) / weighted_avg * 100
                 margin_return = profit_pct * self.config.leverage
                 
@@ -274,12 +429,13 @@ class TradingBot:
                     "exit_price": current_price
                 })
                 
-                # Reset trade
-                trade['is_active'] = False
-                trade['entry_price'] = None
-                trade['current_step'] = 0
-                trade['position_levels'] = []
-                trade['martingale_trigger_prices'] = []
+                # Reset trade, keeping the cycle's profit
+                pnl = current_price * total_contracts - trade.total_cost
+                trade.realized_pnl += pnl
+                trade.reset()
+                self.checkpoint(symbol, current_price, urgent=True)
+                self.schedule_check(symbol)
+                await self.record_trade(symbol, 'sell', order, current_price, total_contracts, pnl, profit_pct)
                 
                 return True
                 
@@ -289,29 +445,30 @@ class TradingBot:
             
     def calculate_weighted_average_entry(self, symbol: str) -> float:
         """Calculate weighted average entry price"""
-        trade = self.trades[symbol]
-        if not trade['position_levels']:
-            return trade['entry_price']
-            
-        total_contracts = sum(level['contracts'] for level in trade['position_levels'])
-        weighted_sum = sum(level['price'] * level['contracts'] for level in trade['position_levels'])
+        return self.trades[symbol].weighted_average_entry()
         
-        return weighted_sum / total_contracts if total_contracts > 0 else trade['entry_price']
+    def calculate_unrealized_pnl(self, symbol: str, current_price: float) -> float:
+        """Calculate unrealized PnL in quote currency"""
+        return self.trades[symbol].unrealized_pnl(current_price)
         
-    def calculate_position_size(self, step: int, price: float) -> float:
-        """Calculate position size"""
+    def calculate_position_size(self, step: int, price: float, symbol: Optional[str] = None) -> float:
+        """Calculate position size rounded to the market's amount step"""
+        market = market_metadata.get(self.bot.exchange, self.sandbox, symbol) if symbol else None
         margin_amount = self.config.martingale_sequence[step]
-        position_value = margin_amount * self.config.leverage
-        position_size = position_value / price
-        return round(position_size, 4)
+        return float(ladder_sizes([margin_amount], self.config.leverage, price, market)[0])
         
     def get_available_symbol(self) -> Optional[str]:
         """Get available symbol for new trade"""
         for symbol in self.bot.symbols:
-            if not self.trades[symbol]['is_active'] and not self.trades[symbol]['trade_in_progress']:
+            trade = self.trades[symbol]
+            if not trade.is_active and not trade.trade_in_progress:
                 return symbol
         return None
         
+    def snapshot(self) -> Dict[str, dict]:
+        """Point-in-time copy of all symbol states for the API"""
+        return {symbol: trade.snapshot() for symbol, trade in self.trades.items()}
+        
     async def send_notification(self, event_type: str, data: dict):
         """Send notification via WebSocket"""
         await websocket_manager.broadcast_bot_update(
@@ -0,0 +1,88 @@
+import math
+import time
+from typing import Dict, Iterable, List, Optional
+
+from app.core.config import settings
+
+
+class SymbolCadence:
+    """Observed price movement and next check time of one symbol"""
+
+    __slots__ = ("last_price", "last_at", "variance_rate", "interval", "next_at")
+
+    def __init__(self):
+        self.last_price: Optional[float] = None
+        self.last_at: Optional[float] = None
+        # EWMA of squared log returns per second
+        self.variance_rate: Optional[float] = None
+        self.interval: Optional[float] = None
+        self.next_at = 0.0
+
+
+class PollCadence:
+    """Decides when each symbol of a bot should be checked next.
+
+    Price is treated as a random walk with the volatility seen between
+    checks; the time it would typically need to cover the distance to the
+    nearest level (take profit or next martingale trigger) is (d / sigma)^2.
+    Symbols are checked again after a fraction of that, clamped between
+    ADAPTIVE_POLL_MIN and ADAPTIVE_POLL_MAX seconds, so symbols close to a
+    level are watched closely and quiet ones rarely.
+    """
+
+    def __init__(self, default_interval: Optional[float] = None, min_interval: Optional[float] = None,
+                 max_interval: Optional[float] = None, safety: Optional[float] = None,
+                 smoothing: float = 0.2):
+        self.default_interval = default_interval if default_interval is not None else settings.BOT_POLL_INTERVAL
+        self.min_interval = min_interval if min_interval is not None else settings.ADAPTIVE_POLL_MIN
+        self.max_interval = max_interval if max_interval is not None else settings.ADAPTIVE_POLL_MAX
+        self.safety = safety if safety is not None else settings.ADAPTIVE_POLL_SAFETY
+        self.smoothing = smoothing
+        self.symbols: Dict[str, SymbolCadence] = {}
+
+    def observe(self, symbol: str, price: float, levels: Iterable[Optional[float]],
+                now: Optional[float] = None) -> float:
+        """Record a checked price and schedule the next check, returning the interval"""
+        now = time.monotonic() if now is None else now
+        state = self.symbols.get(symbol)
+        if state is None:
+            state = SymbolCadence()
+            self.symbols[symbol] = state
+
+        if state.last_price and state.last_at is not None and now > state.last_at and price > 0:
+            log_return = math.log(price / state.last_price)
+            sample = log_return * log_return / (now - state.last_at)
+            if state.variance_rate is None:
+                state.variance_rate = sample
+            else:
+                state.variance_rate += self.smoothing * (sample - state.variance_rate)
+        state.last_price = price
+        state.last_at = now
+
+        distances = [abs(level - price) / price for level in levels if level]
+        if not distances or not state.variance_rate:
+            interval = self.default_interval
+        else:
+            expected = min(distances) ** 2 / state.variance_rate
+            interval = self.safety * expected
+        interval = min(max(interval, self.min_interval), self.max_interval)
+
+        state.interval = interval
+        state.next_at = now + interval
+        return interval
+
+    def due(self, symbols: Iterable[str], now: Optional[float] = None) -> List[str]:
+        """Symbols whose next check time has come (unseen symbols are always due)"""
+        now = time.monotonic() if now is None else now
+        return [
+            symbol for symbol in symbols
+            if symbol not in self.symbols or self.symbols[symbol].next_at <= now
+        ]
+
+    def next_due(self, symbols: Iterable[str]) -> Optional[float]:
+        """Earliest next check time among symbols"""
+        times = [self.symbols[symbol].next_at if symbol in self.symbols else 0.0 for symbol in symbols]
+        return min(times) if times else None
+
+    def forget(self, symbol: str):
+        self.symbols.pop(symbol, None)
@@ -0,0 +1,173 @@
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.config import settings
+from app.db.utils import PERMANENT_ERRORS, default_session_factory
+from app.models import BotPosition
+from app.trading.state import SymbolState
+
+logger = logging.getLogger(__name__)
+
+# Columns written on every checkpoint (bot_id and symbol form the row key)
+CHECKPOINT_COLUMNS = (
+    "side", "is_active", "entry_price", "current_price", "contracts", "current_step",
+    "position_levels", "martingale_trigger_prices", "unrealized_pnl", "realized_pnl",
+)
+
+
+def position_row(bot_id: int, symbol: str, state: SymbolState,
+                 current_price: Optional[float] = None) -> dict:
+    """BotPosition column values for one symbol's live state"""
+    return {
+        "bot_id": bot_id,
+        "symbol": symbol,
+        "side": state.position_side or "buy",
+        "is_active": state.is_active,
+        "entry_price": state.entry_price or 0.0,
+        "current_price": current_price,
+        "contracts": state.total_contracts,
+        "current_step": state.current_step,
+        "position_levels": state.levels.to_list(),
+        "martingale_trigger_prices": list(state.trigger_prices),
+        "unrealized_pnl": state.unrealized_pnl(current_price) if current_price and state.is_active else 0.0,
+        "realized_pnl": state.realized_pnl,
+    }
+
+
+class PositionCheckpointer:
+    """Write-behind persistence of live martingale state into bot_positions.
+
+    Bots call `mark` with the latest row for a symbol; it only replaces an
+    entry in a dict, so the trading loop never waits on the database. Marks
+    for the same (bot, symbol) coalesce, and a background task writes all
+    pending rows in multi-row upserts of at most POSITION_CHECKPOINT_BATCH_SIZE
+    rows every POSITION_CHECKPOINT_INTERVAL seconds, or right away after a
+    fill. Rows the database rejects for good are dropped one by one; rows
+    that failed for any other reason are retried on the next flush.
+    """
+
+    def __init__(self, interval: Optional[float] = None, batch_size: Optional[int] = None,
+                 session_factory=None):
+        self.interval = interval if interval is not None else settings.POSITION_CHECKPOINT_INTERVAL
+        self.batch_size = batch_size or settings.POSITION_CHECKPOINT_BATCH_SIZE
+        self.session_factory = default_session_factory(session_factory)
+        self._pending: Dict[Tuple[int, str], dict] = {}
+        self._preloaded: Dict[int, List[dict]] = {}
+        self._flush_event = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def mark(self, row: dict, urgent: bool = False):
+        """Queue the latest state of a symbol; urgent (fills) flushes without waiting for the interval"""
+        self._pending[(row["bot_id"], row["symbol"])] = row
+        if urgent:
+            self._flush_event.set()
+
+    async def _write(self, rows: List[dict]):
+        stmt = insert(BotPosition).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[BotPosition.bot_id, BotPosition.symbol],
+            set_={
+                **{column: stmt.excluded[column] for column in CHECKPOINT_COLUMNS},
+                "updated_at": func.now(),
+            },
+        )
+        async with self.session_factory() as db:
+            await db.execute(stmt)
+            await db.commit()
+
+    async def _write_each(self, rows: List[dict]):
+        """Write rows one at a time, dropping those the database rejects"""
+        for row in rows:
+            try:
+                await self._write([row])
+            except PERMANENT_ERRORS as e:
+                logger.error(f"Dropping checkpoint of bot {row['bot_id']} {row['symbol']}: {e}")
+
+    async def flush(self):
+        """Upsert every pending row, POSITION_CHECKPOINT_BATCH_SIZE rows per statement"""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            rows = list(batch.values())
+            written = 0
+            try:
+                while written < len(rows):
+                    chunk = rows[written:written + self.batch_size]
+                    try:
+                        await self._write(chunk)
+                    except PERMANENT_ERRORS:
+                        # Isolate the bad rows so they do not block every other bot
+                        await self._write_each(chunk)
+                    written += len(chunk)
+            except Exception as e:
+                logger.error(f"Error checkpointing {len(rows) - written} positions: {e}")
+                self._requeue(rows[written:])
+            except asyncio.CancelledError:
+                self._requeue(rows[written:])
+                raise
+
+    def _requeue(self, rows: List[dict]):
+        """Keep unwritten rows for the next flush unless a newer mark replaced them"""
+        for row in rows:
+            self._pending.setdefault((row["bot_id"], row["symbol"]), row)
+
+    async def preload(self, bot_ids: Optional[Iterable[int]] = None):
+        """Read positions of many bots in one query ahead of their start"""
+        query = select(BotPosition)
+        if bot_ids is not None:
+            query = query.where(BotPosition.bot_id.in_(list(bot_ids)))
+        async with self.session_factory() as db:
+            result = await db.execute(query)
+            positions = result.scalars().all()
+        for position in positions:
+            self._preloaded.setdefault(position.bot_id, []).append(self._to_dict(position))
+
+    async def load(self, bot_id: int) -> Dict[str, dict]:
+        """Persisted rows of a bot by symbol, from the preload when available"""
+        rows = self._preloaded.pop(bot_id, None)
+        if rows is None:
+            async with self.session_factory() as db:
+                result = await db.execute(select(BotPosition).where(BotPosition.bot_id == bot_id))
+                rows = [self._to_dict(position) for position in result.scalars().all()]
+        # Rows not flushed yet are newer than the database
+        merged = {row["symbol"]: row for row in rows}
+        for (pending_bot_id, symbol), row in self._pending.items():
+            if pending_bot_id == bot_id:
+                merged[symbol] = row
+        return merged
+
+    @staticmethod
+    def _to_dict(position: BotPosition) -> dict:
+        row = {column: getattr(position, column) for column in CHECKPOINT_COLUMNS}
+        row.update(bot_id=position.bot_id, symbol=position.symbol)
+        return row
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Stop the flush loop and write whatever is still pending"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        await self.flush()
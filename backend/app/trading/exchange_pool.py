@@ -0,0 +1,151 @@
+import asyncio
+import hashlib
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+import ccxt.async_support as ccxt
+
+from app.core.config import settings
+from app.trading.markets import market_metadata
+from app.trading.rate_limiter import RequestScheduler, ScheduledExchange, request_scheduler
+
+logger = logging.getLogger(__name__)
+
+
+class PooledClient:
+    """Bookkeeping for one shared exchange client"""
+
+    __slots__ = ("client", "scheduled", "exchange_id", "sandbox", "refs", "last_used")
+
+    def __init__(self, client, scheduled: ScheduledExchange, exchange_id: str, sandbox: bool):
+        self.client = client
+        self.scheduled = scheduled
+        self.exchange_id = exchange_id
+        self.sandbox = sandbox
+        self.refs = 0
+        self.last_used = time.monotonic()
+
+
+class ExchangeClientPool:
+    """Authenticated ccxt clients shared by everything using the same credentials.
+
+    Clients keep their HTTP session (and its keep-alive connections) and
+    loaded markets between users. Clients nobody holds are closed after
+    EXCHANGE_CLIENT_IDLE_TIMEOUT seconds. Private calls are scheduled against
+    one token bucket per API key, so bots sharing a key share its budget.
+    """
+
+    def __init__(self, idle_timeout: Optional[float] = None,
+                 scheduler: Optional[RequestScheduler] = None):
+        self.idle_timeout = idle_timeout if idle_timeout is not None else settings.EXCHANGE_CLIENT_IDLE_TIMEOUT
+        self.scheduler = scheduler or request_scheduler
+        self.clients: Dict[str, PooledClient] = {}
+        self._by_client: Dict[int, str] = {}
+        self._evict_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def identity(exchange_id: str, credentials: dict) -> str:
+        """Stable key for decrypted credentials that does not keep them in plain text"""
+        material = "|".join([
+            exchange_id,
+            credentials.get('api_key') or "",
+            credentials.get('secret') or "",
+            credentials.get('passphrase') or "",
+            str(bool(credentials.get('sandbox', True))),
+        ])
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def acquire(self, exchange_id: str, credentials: dict, calls_per_minute: Optional[int] = None):
+        """Get (or create) the client for these credentials and hold a reference.
+
+        calls_per_minute (from the user's subscription tier) sets the key's
+        request budget; without it the current or default budget is kept.
+        """
+        key = self.identity(exchange_id, credentials)
+        self.scheduler.bucket(key, calls_per_minute)
+        pooled = self.clients.get(key)
+        if pooled is None:
+            sandbox = bool(credentials.get('sandbox', True))
+            exchange_class = getattr(ccxt, exchange_id)
+            config = {
+                'apiKey': credentials.get('api_key'),
+                'secret': credentials.get('secret'),
+                'sandbox': sandbox,
+                'enableRateLimit': True,
+            }
+            if credentials.get('passphrase'):
+                config['password'] = credentials['passphrase']
+            client = exchange_class(config)
+            market_metadata.apply(client, exchange_id, sandbox)
+            scheduled = ScheduledExchange(client, self.scheduler, key)
+            pooled = PooledClient(client, scheduled, exchange_id, sandbox)
+            self.clients[key] = pooled
+            self._by_client[id(scheduled)] = key
+        pooled.refs += 1
+        pooled.last_used = time.monotonic()
+        return pooled.scheduled
+
+    def release(self, client):
+        """Drop a reference; the client stays warm until it has been idle long enough"""
+        key = self._by_client.get(id(client))
+        pooled = self.clients.get(key) if key else None
+        if pooled is None:
+            return
+        pooled.refs = max(0, pooled.refs - 1)
+        pooled.last_used = time.monotonic()
+
+    @asynccontextmanager
+    async def client(self, exchange_id: str, credentials: dict, calls_per_minute: Optional[int] = None):
+        """Hold a pooled client for the duration of a block"""
+        client = self.acquire(exchange_id, credentials, calls_per_minute)
+        try:
+            yield client
+        finally:
+            self.release(client)
+
+    async def _close(self, key: str):
+        pooled = self.clients.pop(key, None)
+        if pooled is None:
+            return
+        self._by_client.pop(id(pooled.scheduled), None)
+        self.scheduler.forget(key)
+        try:
+            await pooled.client.close()
+        except Exception as e:
+            logger.error(f"Error closing {pooled.exchange_id} client: {e}")
+
+    async def evict_idle(self):
+        """Close clients nobody holds that have been idle past the timeout"""
+        now = time.monotonic()
+        idle = [
+            key for key, pooled in self.clients.items()
+            if pooled.refs == 0 and now - pooled.last_used >= self.idle_timeout
+        ]
+        for key in idle:
+            await self._close(key)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(max(1.0, self.idle_timeout / 2))
+            await self.evict_idle()
+
+    def start(self):
+        if self._evict_task is None or self._evict_task.done():
+            self._evict_task = asyncio.create_task(self.run())
+
+    async def close_all(self):
+        """Stop eviction and close every client (application shutdown)"""
+        if self._evict_task and not self._evict_task.done():
+            self._evict_task.cancel()
+            try:
+                await self._evict_task
+            except asyncio.CancelledError:
+                pass
+        self._evict_task = None
+        for key in list(self.clients.keys()):
+            await self._close(key)
+
+
+exchange_pool = ExchangeClientPool()
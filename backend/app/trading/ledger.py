@@ -0,0 +1,150 @@
+import asyncio
+import json
+import logging
+import time
+from typing import List, Optional
+
+from sqlalchemy import insert
+
+from app.core.config import settings
+from app.db.utils import PERMANENT_ERRORS, default_session_factory
+from app.models import Trade
+
+logger = logging.getLogger(__name__)
+
+
+def trade_row(bot_id: int, symbol: str, side: str, order: dict, price: float, quantity: float,
+              pnl: float = 0.0, pnl_pct: float = 0.0) -> dict:
+    """Trade column values for one fill"""
+    fee = order.get('fee') or {}
+    return {
+        "bot_id": bot_id,
+        "symbol": symbol,
+        "side": side,
+        "price": price,
+        "quantity": quantity,
+        "exchange_order_id": str(order['id']) if order.get('id') is not None else None,
+        "order_type": order.get('type') or "market",
+        "pnl": pnl,
+        "pnl_pct": pnl_pct,
+        "commission": fee.get('cost') or 0.0,
+    }
+
+
+class TradeLedger:
+    """Queue-backed writer of fills into the trades table.
+
+    Bots `record` a fill by putting it on a bounded in-process queue; one
+    writer task drains it into multi-row inserts of at most
+    TRADE_LEDGER_BATCH_SIZE rows, waiting at most TRADE_LEDGER_MAX_LATENCY
+    seconds to fill a batch. If the database falls behind and the queue fills
+    up, `record` waits for room instead of dropping fills.
+
+    A batch the database rejects (or that still fails after
+    TRADE_LEDGER_MAX_RETRIES retries) is written row by row, and rows that
+    fail on their own are logged as dead letters, so one bad fill cannot
+    stall the queue and with it every bot's trading.
+    """
+
+    def __init__(self, batch_size: Optional[int] = None, max_latency: Optional[float] = None,
+                 queue_size: Optional[int] = None, max_retries: Optional[int] = None,
+                 session_factory=None):
+        self.batch_size = batch_size or settings.TRADE_LEDGER_BATCH_SIZE
+        self.max_retries = max_retries if max_retries is not None else settings.TRADE_LEDGER_MAX_RETRIES
+        self.max_latency = max_latency if max_latency is not None else settings.TRADE_LEDGER_MAX_LATENCY
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or settings.TRADE_LEDGER_QUEUE_SIZE)
+        self.session_factory = default_session_factory(session_factory)
+        # Rows taken off the queue but not yet written
+        self._batch: List[dict] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def record(self, row: dict):
+        """Queue a fill; only waits when the writer is a full queue behind"""
+        try:
+            self.queue.put_nowait(row)
+        except asyncio.QueueFull:
+            logger.warning("Trade ledger queue full, waiting for the writer")
+            await self.queue.put(row)
+
+    async def _next_batch(self) -> List[dict]:
+        """Block for one row, then collect more until the batch is full or the latency is spent"""
+        batch = self._batch
+        batch.append(await self.queue.get())
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _write(self, batch: List[dict]):
+        async with self.session_factory() as db:
+            await db.execute(insert(Trade), batch)
+            await db.commit()
+
+    async def _write_each(self, batch: List[dict]):
+        """Write rows one at a time, dead-lettering the ones that fail"""
+        for row in batch:
+            try:
+                await self._write([row])
+            except Exception as e:
+                logger.error(f"Dead-lettered trade {json.dumps(row, default=str)}: {e}")
+
+    async def _write_batch(self, batch: List[dict]):
+        """Write a batch, retrying a slow or unavailable database a bounded number of times"""
+        retry_delay = 1.0
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self._write(batch)
+                return
+            except PERMANENT_ERRORS as e:
+                logger.error(f"{len(batch)} trades rejected, writing them one by one: {e}")
+                break
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error(f"Giving up on {len(batch)} trades as a batch, writing them one by one: {e}")
+                    break
+                # The queue absorbs new fills meanwhile
+                logger.error(f"Error writing {len(batch)} trades, retrying in {retry_delay:.0f}s: {e}")
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, 30.0)
+        await self._write_each(batch)
+
+    async def run(self):
+        while True:
+            batch = await self._next_batch()
+            await self._write_batch(batch)
+            for _ in batch:
+                self.queue.task_done()
+            self._batch = []
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Stop the writer and write whatever is still queued"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+        rows, self._batch = self._batch, []
+        while not self.queue.empty():
+            rows.append(self.queue.get_nowait())
+            self.queue.task_done()
+        for start in range(0, len(rows), self.batch_size):
+            try:
+                await self._write(rows[start:start + self.batch_size])
+            except PERMANENT_ERRORS:
+                await self._write_each(rows[start:start + self.batch_size])
+            except Exception as e:
+                logger.error(f"Lost {len(rows) - start} trades on shutdown: {e}")
+                break
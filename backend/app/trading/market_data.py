@@ -0,0 +1,320 @@
+import ccxt.async_support as ccxt
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.trading.markets import market_metadata
+from app.trading.price_feed import PriceFeed, create_price_feed
+
+logger = logging.getLogger(__name__)
+
+
+class TickerSnapshot:
+    """Immutable view of a ticker shared by every bot subscribed to a symbol"""
+
+    __slots__ = ("symbol", "last", "bid", "ask", "timestamp", "fetched_at")
+
+    def __init__(self, symbol: str, last: float, bid: Optional[float] = None,
+                 ask: Optional[float] = None, timestamp: Optional[int] = None,
+                 fetched_at: Optional[float] = None):
+        self.symbol = symbol
+        self.last = last
+        self.bid = bid
+        self.ask = ask
+        self.timestamp = timestamp
+        self.fetched_at = fetched_at if fetched_at is not None else time.monotonic()
+
+    @classmethod
+    def from_ccxt(cls, symbol: str, ticker: dict) -> "TickerSnapshot":
+        return cls(
+            symbol=symbol,
+            last=ticker.get('last'),
+            bid=ticker.get('bid'),
+            ask=ticker.get('ask'),
+            timestamp=ticker.get('timestamp'),
+        )
+
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+
+class MarketDataHub:
+    """Process-wide ticker cache shared by all running bots.
+
+    Each (exchange, symbol) is fetched at most once per staleness window no
+    matter how many bots are subscribed to it; concurrent readers of a stale
+    symbol wait on the same in-flight request. Subscribed symbols are grouped
+    by exchange and refreshed with one bulk fetch_tickers call per interval.
+
+    In stream or replay mode a PriceFeed per exchange pushes ticks into the
+    cache and wakes subscribed bots; polling only covers symbols the feed
+    has left stale.
+    """
+
+    def __init__(self, default_max_age: Optional[float] = None,
+                 refresh_interval: Optional[float] = None,
+                 feed_mode: Optional[str] = None):
+        self.default_max_age = (
+            default_max_age if default_max_age is not None
+            else settings.MARKET_DATA_MAX_AGE
+        )
+        self.refresh_interval = (
+            refresh_interval if refresh_interval is not None
+            else settings.MARKET_DATA_REFRESH_INTERVAL
+        )
+        self.clients: Dict[Tuple[str, bool], ccxt.Exchange] = {}
+        self.tickers: Dict[Tuple[str, bool, str], TickerSnapshot] = {}
+        self.max_ages: Dict[str, float] = {}
+        # Staleness each subscriber currently needs per symbol (adaptive cadence)
+        self.requested_ages: Dict[Tuple[str, bool, str], Dict[str, float]] = {}
+        self.subscribers: Dict[Tuple[str, bool, str], Set[str]] = {}
+        self._inflight: Dict[Tuple[str, bool, str], asyncio.Future] = {}
+        self._refreshing: Dict[Tuple[str, bool], asyncio.Future] = {}
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.feed_mode = feed_mode or settings.PRICE_FEED_MODE
+        self.feeds: Dict[Tuple[str, bool], PriceFeed] = {}
+        self._feed_tasks: Dict[Tuple[str, bool], asyncio.Task] = {}
+        self.tick_events: Dict[str, asyncio.Event] = {}
+
+    @property
+    def is_streaming(self) -> bool:
+        return self.feed_mode != "poll"
+
+    def _get_client(self, exchange_id: str, sandbox: bool) -> ccxt.Exchange:
+        """Get public (unauthenticated) client used for market data"""
+        key = (exchange_id, sandbox)
+        if key not in self.clients:
+            exchange_class = getattr(ccxt, exchange_id)
+            self.clients[key] = exchange_class({
+                'sandbox': sandbox,
+                'enableRateLimit': True,
+            })
+            market_metadata.apply(self.clients[key], exchange_id, sandbox)
+        return self.clients[key]
+
+    def set_max_age(self, symbol: str, seconds: float):
+        """Override staleness limit for a symbol"""
+        self.max_ages[symbol] = seconds
+
+    def get_max_age(self, symbol: str) -> float:
+        return self.max_ages.get(symbol, self.default_max_age)
+
+    def request_max_age(self, subscriber_id: str, exchange_id: str, sandbox: bool,
+                        symbol: str, seconds: float):
+        """Let a subscriber say how fresh it needs a symbol right now"""
+        self.requested_ages.setdefault((exchange_id, sandbox, symbol), {})[subscriber_id] = seconds
+
+    def _max_age(self, key: Tuple[str, bool, str]) -> float:
+        """Staleness limit of a symbol: explicit override, else the most demanding subscriber"""
+        symbol = key[2]
+        if symbol in self.max_ages:
+            return self.max_ages[symbol]
+        requested = self.requested_ages.get(key)
+        if requested:
+            return min(requested.values())
+        return self.default_max_age
+
+    def subscribe(self, subscriber_id: str, exchange_id: str, sandbox: bool, symbols):
+        """Register interest of a bot in a set of symbols"""
+        for symbol in symbols:
+            self.subscribers.setdefault((exchange_id, sandbox, symbol), set()).add(subscriber_id)
+
+    def tick_event(self, subscriber_id: str) -> asyncio.Event:
+        """Event set whenever a pushed tick arrives for one of the subscriber's symbols"""
+        if subscriber_id not in self.tick_events:
+            self.tick_events[subscriber_id] = asyncio.Event()
+        return self.tick_events[subscriber_id]
+
+    def publish(self, exchange_id: str, sandbox: bool, symbol: str, ticker: dict):
+        """Store a pushed ticker and wake every bot subscribed to it"""
+        key = (exchange_id, sandbox, symbol)
+        subscribers = self.subscribers.get(key)
+        if not subscribers:
+            return
+        self.tickers[key] = TickerSnapshot.from_ccxt(symbol, ticker)
+        for subscriber_id in subscribers:
+            event = self.tick_events.get(subscriber_id)
+            if event:
+                event.set()
+
+    def unsubscribe(self, subscriber_id: str):
+        """Drop all subscriptions of a bot and forget unused symbols"""
+        self.tick_events.pop(subscriber_id, None)
+        for key in list(self.subscribers.keys()):
+            subscribers = self.subscribers[key]
+            subscribers.discard(subscriber_id)
+            requested = self.requested_ages.get(key)
+            if requested:
+                requested.pop(subscriber_id, None)
+            if not subscribers:
+                del self.subscribers[key]
+                self.tickers.pop(key, None)
+                self.requested_ages.pop(key, None)
+
+    def symbols_by_exchange(self) -> Dict[Tuple[str, bool], List[str]]:
+        """Group subscribed symbols by (exchange, sandbox)"""
+        groups: Dict[Tuple[str, bool], List[str]] = {}
+        for exchange_id, sandbox, symbol in self.subscribers:
+            groups.setdefault((exchange_id, sandbox), []).append(symbol)
+        return groups
+
+    async def refresh(self, exchange_id: str, sandbox: bool,
+                      symbols: Optional[List[str]] = None) -> Dict[str, TickerSnapshot]:
+        """Refresh subscribed symbols of an exchange (all by default) with one bulk call"""
+        client_key = (exchange_id, sandbox)
+        inflight = self._refreshing.get(client_key)
+        if inflight:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._refreshing[client_key] = future
+        snapshots: Dict[str, TickerSnapshot] = {}
+        try:
+            if symbols is None:
+                symbols = self.symbols_by_exchange().get(client_key, [])
+            if symbols:
+                client = self._get_client(exchange_id, sandbox)
+                if client.has.get('fetchTickers'):
+                    tickers = await client.fetch_tickers(symbols)
+                    for symbol in symbols:
+                        ticker = tickers.get(symbol)
+                        if ticker:
+                            snapshot = TickerSnapshot.from_ccxt(symbol, ticker)
+                            self.tickers[(exchange_id, sandbox, symbol)] = snapshot
+                            snapshots[symbol] = snapshot
+                else:
+                    results = await asyncio.gather(
+                        *(self._fetch_one(exchange_id, sandbox, symbol) for symbol in symbols)
+                    )
+                    snapshots = {snapshot.symbol: snapshot for snapshot in results if snapshot}
+        except Exception as e:
+            logger.error(f"Error refreshing tickers on {exchange_id}: {e}")
+        finally:
+            future.set_result(snapshots)
+            del self._refreshing[client_key]
+        return snapshots
+
+    async def get_ticker(self, exchange_id: str, sandbox: bool, symbol: str,
+                         max_age: Optional[float] = None) -> Optional[TickerSnapshot]:
+        """Get ticker snapshot, refreshing it if older than the staleness limit"""
+        key = (exchange_id, sandbox, symbol)
+        if max_age is None:
+            max_age = self._max_age(key)
+
+        snapshot = self.tickers.get(key)
+        if snapshot and snapshot.age() <= max_age:
+            return snapshot
+
+        # Subscribed symbols are refreshed together with the rest of their exchange
+        if key in self.subscribers:
+            snapshots = await self.refresh(exchange_id, sandbox)
+            if symbol in snapshots:
+                return snapshots[symbol]
+
+        return await self._fetch_one(exchange_id, sandbox, symbol)
+
+    async def _fetch_one(self, exchange_id: str, sandbox: bool, symbol: str) -> Optional[TickerSnapshot]:
+        """Fetch a single ticker, sharing the request with concurrent callers"""
+        key = (exchange_id, sandbox, symbol)
+        inflight = self._inflight.get(key)
+        if inflight:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            ticker = await self._get_client(exchange_id, sandbox).fetch_ticker(symbol)
+            snapshot = TickerSnapshot.from_ccxt(symbol, ticker)
+            self.tickers[key] = snapshot
+            future.set_result(snapshot)
+            return snapshot
+        except Exception as e:
+            logger.error(f"Error fetching ticker {symbol} on {exchange_id}: {e}")
+            future.set_result(None)
+            return None
+        finally:
+            if not future.done():
+                future.set_result(None)
+            del self._inflight[key]
+
+    async def get_price(self, exchange_id: str, sandbox: bool, symbol: str,
+                        max_age: Optional[float] = None) -> Optional[float]:
+        snapshot = await self.get_ticker(exchange_id, sandbox, symbol, max_age)
+        return snapshot.last if snapshot else None
+
+    def _stale(self, exchange_id: str, sandbox: bool, symbols: List[str]) -> List[str]:
+        stale = []
+        for symbol in symbols:
+            key = (exchange_id, sandbox, symbol)
+            snapshot = self.tickers.get(key)
+            if not snapshot or snapshot.age() > self._max_age(key):
+                stale.append(symbol)
+        return stale
+
+    async def run(self):
+        """Refresh stale subscribed symbols every refresh interval"""
+        while True:
+            groups = {}
+            for (exchange_id, sandbox), symbols in self.symbols_by_exchange().items():
+                stale = self._stale(exchange_id, sandbox, symbols)
+                if stale:
+                    groups[(exchange_id, sandbox)] = stale
+            if groups:
+                await asyncio.gather(
+                    *(self.refresh(exchange_id, sandbox, symbols)
+                      for (exchange_id, sandbox), symbols in groups.items()),
+                    return_exceptions=True
+                )
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self):
+        """Start background refresh loop and price feeds if they are not running"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self.run())
+
+        if not self.is_streaming:
+            return
+        for client_key in self.symbols_by_exchange():
+            task = self._feed_tasks.get(client_key)
+            if task and not task.done():
+                continue
+            feed = self.feeds.get(client_key) or create_price_feed(
+                self.feed_mode, self, client_key[0], client_key[1],
+                replay_url=settings.PRICE_FEED_REPLAY_URL
+            )
+            if feed:
+                self.feeds[client_key] = feed
+                self._feed_tasks[client_key] = asyncio.create_task(feed.run())
+
+    async def stop(self):
+        """Stop background refresh loop and price feeds"""
+        tasks = list(self._feed_tasks.values())
+        if self._refresh_task:
+            tasks.append(self._refresh_task)
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        for feed in self.feeds.values():
+            await feed.close()
+        self.feeds.clear()
+        self._feed_tasks.clear()
+        self._refresh_task = None
+
+    def clear(self):
+        self.tickers.clear()
+        self.subscribers.clear()
+        self.requested_ages.clear()
+        self.tick_events.clear()
+
+    async def close(self):
+        """Close HTTP sessions of all market data clients"""
+        for client in self.clients.values():
+            try:
+                await client.close()
+            except Exception as e:
+                logger.error(f"Error closing market data client: {e}")
+        self.clients.clear()
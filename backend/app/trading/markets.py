@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import ccxt.async_support as ccxt
+from ccxt.base.decimal_to_precision import TICK_SIZE
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class MarketInfo:
+    """Order sizing limits of one market"""
+
+    __slots__ = ("symbol", "amount_step", "min_amount", "min_cost", "contract_size")
+
+    def __init__(self, symbol: str, amount_step: Optional[float] = None,
+                 min_amount: Optional[float] = None, min_cost: Optional[float] = None,
+                 contract_size: Optional[float] = None):
+        self.symbol = symbol
+        self.amount_step = amount_step
+        self.min_amount = min_amount
+        self.min_cost = min_cost
+        self.contract_size = contract_size or 1.0
+
+    @classmethod
+    def from_ccxt(cls, market: dict, precision_mode: int) -> "MarketInfo":
+        precision = market.get('precision') or {}
+        limits = market.get('limits') or {}
+        amount_precision = precision.get('amount')
+        if amount_precision is None:
+            amount_step = None
+        elif precision_mode == TICK_SIZE:
+            amount_step = float(amount_precision)
+        else:
+            amount_step = 10 ** -int(amount_precision)
+        return cls(
+            symbol=market['symbol'],
+            amount_step=amount_step,
+            min_amount=(limits.get('amount') or {}).get('min'),
+            min_cost=(limits.get('cost') or {}).get('min'),
+            contract_size=market.get('contractSize'),
+        )
+
+
+def ladder_sizes(margins: Sequence[float], leverage: int, prices, market: Optional[MarketInfo] = None) -> np.ndarray:
+    """Order amounts for martingale levels in one vectorized pass.
+
+    prices is a scalar or one price per level. Amounts are floored to the
+    market's amount step, then raised to the market minimum (amount and
+    cost) so they are not rejected; a level whose margin is below the market
+    minimum therefore uses more margin than configured. Without market
+    metadata amounts are rounded to 4 decimals as before.
+    """
+    margins = np.asarray(margins, dtype=float)
+    prices = np.broadcast_to(np.asarray(prices, dtype=float), margins.shape)
+    if market is None:
+        return np.round(margins * leverage / prices, 4)
+
+    amounts = margins * leverage / (prices * market.contract_size)
+    step = market.amount_step
+    if step:
+        # Small epsilon so exact multiples are not floored one step down
+        amounts = np.floor(amounts / step + 1e-9) * step
+    minimum = market.min_amount or 0.0
+    if market.min_cost:
+        min_for_cost = market.min_cost / (prices * market.contract_size)
+        if step:
+            min_for_cost = np.ceil(min_for_cost / step - 1e-9) * step
+        minimum = np.maximum(minimum, min_for_cost)
+    amounts = np.maximum(amounts, minimum)
+    if step:
+        # Re-quantize to strip float noise introduced by the step arithmetic
+        decimals = max(0, int(np.ceil(-np.log10(step))))
+        amounts = np.round(amounts, decimals)
+    return amounts
+
+
+class MarketMetadataCache:
+    """Process-wide markets cache shared by all exchange clients.
+
+    Markets are loaded once per (exchange, sandbox) through a public client
+    and pushed into other clients with set_markets, so authenticated clients
+    never perform their own load_markets round trip.
+    """
+
+    def __init__(self, refresh_interval: Optional[float] = None):
+        self.refresh_interval = (
+            refresh_interval if refresh_interval is not None
+            else settings.MARKET_METADATA_REFRESH_INTERVAL
+        )
+        self.markets: Dict[Tuple[str, bool], dict] = {}
+        self.currencies: Dict[Tuple[str, bool], dict] = {}
+        self.info: Dict[Tuple[str, bool], Dict[str, MarketInfo]] = {}
+        self.loaded_at: Dict[Tuple[str, bool], float] = {}
+        self._inflight: Dict[Tuple[str, bool], asyncio.Future] = {}
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def load(self, exchange_id: str, sandbox: bool = False, reload: bool = False) -> Optional[dict]:
+        """Load markets for an exchange, once unless reload is requested"""
+        key = (exchange_id, sandbox)
+        if key in self.markets and not reload:
+            return self.markets[key]
+
+        inflight = self._inflight.get(key)
+        if inflight:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        client = getattr(ccxt, exchange_id)({'sandbox': sandbox, 'enableRateLimit': True})
+        try:
+            markets = await client.load_markets(reload=True)
+            self.markets[key] = markets
+            self.currencies[key] = client.currencies
+            self.info[key] = {
+                symbol: MarketInfo.from_ccxt(market, client.precisionMode)
+                for symbol, market in markets.items()
+            }
+            self.loaded_at[key] = time.monotonic()
+            future.set_result(markets)
+            return markets
+        except Exception as e:
+            logger.error(f"Error loading markets for {exchange_id}: {e}")
+            future.set_result(self.markets.get(key))
+            return self.markets.get(key)
+        finally:
+            if not future.done():
+                future.set_result(None)
+            del self._inflight[key]
+            await client.close()
+
+    def get(self, exchange_id: str, sandbox: bool, symbol: str) -> Optional[MarketInfo]:
+        return self.info.get((exchange_id, sandbox), {}).get(symbol)
+
+    def apply(self, client, exchange_id: str, sandbox: bool) -> bool:
+        """Share loaded markets with a client, True if markets were available"""
+        key = (exchange_id, sandbox)
+        markets = self.markets.get(key)
+        if not markets or not hasattr(client, 'set_markets'):
+            return False
+        client.set_markets(markets, self.currencies.get(key))
+        return True
+
+    async def run(self):
+        """Reload every known exchange's markets each refresh interval"""
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            for exchange_id, sandbox in list(self.markets):
+                await self.load(exchange_id, sandbox, reload=True)
+
+    def start(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._refresh_task and not self._refresh_task.done():
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+        self._refresh_task = None
+
+
+market_metadata = MarketMetadataCache()
@@ -0,0 +1,220 @@
+"""
+Parallel parameter sweep over BotConfig fields using the vectorized backtester.
+
+    python -m app.trading.optimizer --symbols HYPE/USDT:USDT NEAR/USDT:USDT \
+        --days 90 --leverage 10,20,25 --take-profit 0.4,0.56,0.8 \
+        --trigger 0.8,1.1,1.5 --max-positions 1,2 --prune-drawdown 60
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from app.trading.backtest import BacktestParams, load_ohlcv, run_backtest
+from app.trading.markets import MarketInfo, market_metadata
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEQUENCE = [0.20, 0.27, 0.36, 0.47, 0.63, 0.83, 1.08, 1.43, 1.88, 2.47, 3.25]
+
+# Candle arrays and market metadata shared with pool workers once instead of pickled per task
+_worker_data: Dict[str, np.ndarray] = {}
+_worker_markets: Dict[str, MarketInfo] = {}
+
+
+def _init_worker(data: Dict[str, np.ndarray], markets: Optional[Dict[str, MarketInfo]] = None):
+    global _worker_data, _worker_markets
+    _worker_data = data
+    _worker_markets = markets or {}
+
+
+def parameter_grid(leverage: Sequence[int] = (25,),
+                   take_profit_pct: Sequence[float] = (0.56,),
+                   martingale_trigger_pct: Sequence[float] = (1.1,),
+                   max_positions: Sequence[int] = (2,),
+                   martingale_sequences: Sequence[Sequence[float]] = (DEFAULT_SEQUENCE,)) -> List[dict]:
+    """Cartesian product of candidate BotConfig values"""
+    return [
+        {
+            "leverage": lev,
+            "take_profit_pct": tp,
+            "martingale_trigger_pct": trigger,
+            "max_positions": positions,
+            "martingale_sequence": list(sequence),
+        }
+        for lev, tp, trigger, positions, sequence in itertools.product(
+            leverage, take_profit_pct, martingale_trigger_pct, max_positions, martingale_sequences
+        )
+    ]
+
+
+def ladder_loss_at_last_level(config: dict) -> float:
+    """Unrealized loss of a full ladder when price reaches the last trigger level"""
+    retain = 1 - config["martingale_trigger_pct"] / 100
+    sequence = np.asarray(config["martingale_sequence"], dtype=float)
+    # Level k fills at entry * retain**k; price then sits at entry * retain**(n-1)
+    relative_fill = retain ** np.arange(len(sequence))
+    last = relative_fill[-1]
+    return float(np.sum(sequence * config["leverage"] * (1 - last / relative_fill)))
+
+
+def evaluate(config: dict, symbols: List[str], fee_rate: float,
+             initial_balance: Optional[float], prune_drawdown_pct: Optional[float]) -> dict:
+    """Backtest one config across symbols (runs inside a pool worker).
+
+    TradingBot always refills a free slot with the first idle symbol in order,
+    so with max_positions=k the first k symbols are the ones traded. Their
+    results are summed; drawdown is the sum of per-symbol drawdowns, an upper
+    bound on the combined one.
+
+    With prune_drawdown_pct a symbol's run stops once its drawdown exceeds
+    that percentage of its share of the balance, and the config is pruned;
+    so is one that gets liquidated. Without it every run goes to the end and
+    liquidation is only reported.
+    """
+    traded = symbols[:config["max_positions"]]
+    ladder_margin = sum(config["martingale_sequence"])
+    balance = initial_balance if initial_balance is not None else ladder_margin * len(traded)
+    # Each symbol runs against its share of the balance
+    share = balance / len(traded)
+
+    row = dict(config)
+    row.update(total_pnl=0.0, max_drawdown=0.0, cycles=0, deepest_level=0,
+               fees=0.0, liquidated=False, pruned=False)
+
+    # Static prune: the account would be wiped out before the ladder is even filled
+    if prune_drawdown_pct is not None and ladder_loss_at_last_level(config) >= share:
+        row["pruned"] = True
+        return row
+
+    for symbol in traded:
+        params = BacktestParams(
+            leverage=config["leverage"],
+            take_profit_pct=config["take_profit_pct"],
+            martingale_trigger_pct=config["martingale_trigger_pct"],
+            martingale_sequence=config["martingale_sequence"],
+            fee_rate=fee_rate,
+            initial_balance=share,
+        )
+        result = run_backtest(_worker_data[symbol], params, stop_drawdown_pct=prune_drawdown_pct,
+                              market=_worker_markets.get(symbol))
+        row["total_pnl"] += result.total_pnl
+        row["max_drawdown"] += result.max_drawdown
+        row["cycles"] += result.cycles
+        row["deepest_level"] = max(row["deepest_level"], result.deepest_level)
+        row["fees"] += result.fees
+        row["liquidated"] = row["liquidated"] or result.liquidated
+        if result.aborted or (result.liquidated and prune_drawdown_pct is not None):
+            row["pruned"] = True
+            break
+
+    row["total_return_pct"] = row["total_pnl"] / balance * 100
+    row["max_drawdown_pct"] = row["max_drawdown"] / balance * 100
+    return row
+
+
+def optimize(ohlcv: Dict[str, object], grid: List[dict], fee_rate: float = 0.0006,
+             initial_balance: Optional[float] = None, prune_drawdown_pct: Optional[float] = None,
+             sort_by: str = "total_return_pct", max_workers: Optional[int] = None,
+             markets: Optional[Dict[str, MarketInfo]] = None) -> pd.DataFrame:
+    """Run the grid across a process pool and return results ranked best first.
+
+    ohlcv maps symbol to candles (DataFrame or ccxt OHLCV rows), in the order
+    the bot lists its symbols; markets maps symbols to the metadata orders
+    are sized with. Pruned configurations are kept at the bottom,
+    liquidated ones just above them.
+    """
+    symbols = list(ohlcv.keys())
+    data = {}
+    for symbol, candles in ohlcv.items():
+        if isinstance(candles, pd.DataFrame):
+            candles = candles[["timestamp", "open", "high", "low", "close"]].to_numpy(dtype=float)
+        data[symbol] = np.asarray(candles, dtype=float)
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(),
+                             initializer=_init_worker, initargs=(data, markets)) as pool:
+        futures = [
+            pool.submit(evaluate, config, symbols, fee_rate, initial_balance, prune_drawdown_pct)
+            for config in grid
+        ]
+        for future in as_completed(futures):
+            rows.append(future.result())
+
+    results = pd.DataFrame(rows)
+    if results.empty:
+        return results
+    results["martingale_sequence"] = results["martingale_sequence"].apply(json.dumps)
+    results = results.sort_values(
+        ["pruned", "liquidated", sort_by], ascending=[True, True, False]
+    ).reset_index(drop=True)
+    results.index += 1
+    results.index.name = "rank"
+    return results
+
+
+def _floats(value: str) -> List[float]:
+    return [float(v) for v in value.split(",")]
+
+
+def _ints(value: str) -> List[int]:
+    return [int(v) for v in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep bot parameters over historical data")
+    parser.add_argument("--exchange", default="bitget")
+    parser.add_argument("--symbols", nargs="+", default=["HYPE/USDT:USDT", "NEAR/USDT:USDT"])
+    parser.add_argument("--timeframe", default="1m")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--leverage", type=_ints, default=[25])
+    parser.add_argument("--take-profit", type=_floats, default=[0.56])
+    parser.add_argument("--trigger", type=_floats, default=[1.1])
+    parser.add_argument("--max-positions", type=_ints, default=[2])
+    parser.add_argument("--ladders", type=json.loads, default=[DEFAULT_SEQUENCE],
+                        help="JSON list of martingale sequences")
+    parser.add_argument("--fee-rate", type=float, default=0.0006)
+    parser.add_argument("--balance", type=float, default=None)
+    parser.add_argument("--prune-drawdown", type=float, default=None,
+                        help="Prune configs once drawdown exceeds this percentage of the balance")
+    parser.add_argument("--sort-by", default="total_return_pct")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--output", help="Write the full ranked table to this CSV file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    since = int((datetime.utcnow() - timedelta(days=args.days)).timestamp() * 1000)
+
+    async def load_all():
+        frames = await asyncio.gather(
+            *(load_ohlcv(args.exchange, symbol, args.timeframe, since) for symbol in args.symbols),
+            market_metadata.load(args.exchange),
+        )
+        markets = {
+            symbol: market_metadata.get(args.exchange, False, symbol) for symbol in args.symbols
+        }
+        return dict(zip(args.symbols, frames)), {s: m for s, m in markets.items() if m is not None}
+
+    ohlcv, markets = asyncio.run(load_all())
+    grid = parameter_grid(args.leverage, args.take_profit, args.trigger, args.max_positions, args.ladders)
+    logger.info(f"Evaluating {len(grid)} configurations over {len(args.symbols)} symbols")
+
+    results = optimize(ohlcv, grid, fee_rate=args.fee_rate, initial_balance=args.balance,
+                       prune_drawdown_pct=args.prune_drawdown, sort_by=args.sort_by,
+                       max_workers=args.workers, markets=markets)
+    if args.output:
+        results.to_csv(args.output)
+    print(results.head(args.top).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import time
+import uuid
+import logging
+from typing import Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PaperPosition:
+    """Simulated net long position of one symbol"""
+
+    __slots__ = ("contracts", "cost", "leverage")
+
+    def __init__(self, leverage: int):
+        self.contracts = 0.0
+        self.cost = 0.0
+        self.leverage = leverage
+
+    @property
+    def margin(self) -> float:
+        return self.cost / self.leverage if self.leverage else self.cost
+
+
+class PaperExchange:
+    """In-memory exchange for TradingMode.PAPER bots.
+
+    Implements the subset of the ccxt API TradingBot uses (balance, ticker,
+    leverage, market orders and reduce-only closes) and fills against the
+    shared MarketDataHub, so paper bots spend no private rate-limit budget.
+    """
+
+    def __init__(self, market_data, exchange_id: str, sandbox: bool = False,
+                 initial_balance: Optional[float] = None, fee_rate: Optional[float] = None,
+                 slippage_pct: Optional[float] = None, quote_currency: str = "USDT"):
+        self.market_data = market_data
+        self.exchange_id = exchange_id
+        self.sandbox = sandbox
+        self.quote_currency = quote_currency
+        self.wallet = initial_balance if initial_balance is not None else settings.PAPER_INITIAL_BALANCE
+        self.fee_rate = fee_rate if fee_rate is not None else settings.PAPER_FEE_RATE
+        self.slippage_pct = slippage_pct if slippage_pct is not None else settings.PAPER_SLIPPAGE_PCT
+        self.leverages: Dict[str, int] = {}
+        self.positions: Dict[str, PaperPosition] = {}
+
+    def restore_position(self, symbol: str, contracts: float, cost: float, leverage: int,
+                         realized_pnl: float = 0.0):
+        """Re-open a position restored from a checkpoint so it can be added to and closed"""
+        if contracts > 0:
+            position = PaperPosition(leverage)
+            position.contracts = contracts
+            position.cost = cost
+            self.positions[symbol] = position
+            self.leverages[symbol] = leverage
+        # Fees paid before the restart are not stored, realized PnL is
+        self.wallet += realized_pnl
+
+    async def fetch_balance(self, params: Optional[dict] = None) -> dict:
+        used = sum(position.margin for position in self.positions.values())
+        balance = {'free': self.wallet - used, 'used': used, 'total': self.wallet}
+        return {
+            self.quote_currency: balance,
+            'free': {self.quote_currency: balance['free']},
+            'used': {self.quote_currency: balance['used']},
+            'total': {self.quote_currency: balance['total']},
+        }
+
+    async def fetch_ticker(self, symbol: str) -> dict:
+        # Fills need a current quote, not one at the symbol's (possibly slow) polling cadence
+        snapshot = await self.market_data.get_ticker(
+            self.exchange_id, self.sandbox, symbol, max_age=settings.MARKET_DATA_MAX_AGE
+        )
+        if not snapshot:
+            raise RuntimeError(f"No market data for {symbol}")
+        return {
+            'symbol': symbol,
+            'last': snapshot.last,
+            'bid': snapshot.bid,
+            'ask': snapshot.ask,
+            'timestamp': snapshot.timestamp,
+        }
+
+    async def set_leverage(self, leverage: int, symbol: str, params: Optional[dict] = None) -> dict:
+        self.leverages[symbol] = leverage
+        return {'symbol': symbol, 'leverage': leverage}
+
+    async def set_margin_mode(self, margin_mode: str, symbol: str, params: Optional[dict] = None) -> dict:
+        return {'symbol': symbol, 'marginMode': margin_mode}
+
+    async def fetch_positions(self, symbols=None, params: Optional[dict] = None) -> list:
+        return [
+            {
+                'symbol': symbol,
+                'contracts': position.contracts,
+                'leverage': position.leverage,
+                'marginMode': 'cross',
+            }
+            for symbol, position in self.positions.items()
+            if symbols is None or symbol in symbols
+        ]
+
+    async def create_market_order(self, symbol: str, side: str, amount: float,
+                                  price: Optional[float] = None, params: Optional[dict] = None) -> dict:
+        params = params or {}
+        ticker = await self.fetch_ticker(symbol)
+
+        # Cross the spread when quotes are available, then apply slippage
+        if side == 'buy':
+            reference = ticker.get('ask') or ticker['last']
+            fill_price = reference * (1 + self.slippage_pct / 100)
+        else:
+            reference = ticker.get('bid') or ticker['last']
+            fill_price = reference * (1 - self.slippage_pct / 100)
+
+        position = self.positions.get(symbol)
+        if position is None:
+            position = PaperPosition(self.leverages.get(symbol, settings.DEFAULT_LEVERAGE))
+            self.positions[symbol] = position
+
+        if side == 'sell' and params.get('reduceOnly'):
+            amount = min(amount, position.contracts)
+            if amount <= 0:
+                raise RuntimeError(f"No open position to reduce for {symbol}")
+
+        notional = fill_price * amount
+        fee = notional * self.fee_rate
+        realized_pnl = 0.0
+
+        if side == 'buy':
+            if notional / position.leverage + fee > self.wallet - sum(p.margin for p in self.positions.values()):
+                raise RuntimeError("Insufficient paper balance")
+            position.contracts += amount
+            position.cost += notional
+        else:
+            average = position.cost / position.contracts if position.contracts else fill_price
+            realized_pnl = (fill_price - average) * amount
+            position.contracts -= amount
+            position.cost -= average * amount
+            if position.contracts <= 1e-12:
+                del self.positions[symbol]
+
+        self.wallet += realized_pnl - fee
+
+        order = {
+            'id': uuid.uuid4().hex,
+            'symbol': symbol,
+            'type': 'market',
+            'side': side,
+            'amount': amount,
+            'filled': amount,
+            'price': fill_price,
+            'average': fill_price,
+            'cost': notional,
+            'fee': {'cost': fee, 'currency': self.quote_currency},
+            'status': 'closed',
+            'timestamp': int(time.time() * 1000),
+            'info': {'paper': True, 'realized_pnl': realized_pnl},
+        }
+        return order
+
+    async def close(self):
+        pass
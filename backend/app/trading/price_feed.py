@@ -0,0 +1,128 @@
+import asyncio
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import Optional
+
+import ccxt.pro as ccxtpro
+import websockets
+
+logger = logging.getLogger(__name__)
+
+
+class PriceFeed(ABC):
+    """Streams ticker updates for one (exchange, sandbox) group into a MarketDataHub"""
+
+    reconnect_delay = 1.0
+    max_reconnect_delay = 30.0
+
+    def __init__(self, hub, exchange_id: str, sandbox: bool):
+        self.hub = hub
+        self.exchange_id = exchange_id
+        self.sandbox = sandbox
+
+    def symbols(self):
+        return self.hub.symbols_by_exchange().get((self.exchange_id, self.sandbox), [])
+
+    async def run(self):
+        """Consume the feed forever, reconnecting with backoff on errors"""
+        delay = self.reconnect_delay
+        while True:
+            try:
+                await self.stream()
+                delay = self.reconnect_delay
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"{self.__class__.__name__} for {self.exchange_id} failed: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    @abstractmethod
+    async def stream(self):
+        """Feed ticker updates into the hub until the connection ends"""
+
+    async def close(self):
+        pass
+
+
+class ExchangeStreamFeed(PriceFeed):
+    """Ticker updates pushed by the exchange WebSocket API via ccxt.pro"""
+
+    def __init__(self, hub, exchange_id: str, sandbox: bool):
+        super().__init__(hub, exchange_id, sandbox)
+        exchange_class = getattr(ccxtpro, exchange_id)
+        self.client = exchange_class({
+            'sandbox': sandbox,
+            'enableRateLimit': True,
+        })
+
+    async def stream(self):
+        while True:
+            symbols = self.symbols()
+            if not symbols:
+                await asyncio.sleep(self.reconnect_delay)
+                continue
+
+            if self.client.has.get('watchTickers'):
+                tickers = await self.client.watch_tickers(symbols)
+            else:
+                # One watcher per symbol, publish whichever updates first
+                tasks = [asyncio.create_task(self.client.watch_ticker(symbol)) for symbol in symbols]
+                done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in pending:
+                    task.cancel()
+                tickers = {}
+                for task in done:
+                    ticker = task.result()
+                    tickers[ticker['symbol']] = ticker
+
+            for symbol, ticker in tickers.items():
+                self.hub.publish(self.exchange_id, self.sandbox, symbol, ticker)
+
+    async def close(self):
+        try:
+            await self.client.close()
+        except Exception as e:
+            logger.error(f"Error closing stream client: {e}")
+
+
+class ReplayFeed(PriceFeed):
+    """Ticker updates from a local replay server (see app.trading.replay_server)"""
+
+    def __init__(self, hub, exchange_id: str, sandbox: bool, url: str):
+        super().__init__(hub, exchange_id, sandbox)
+        self.url = url
+
+    async def stream(self):
+        async with websockets.connect(self.url) as websocket:
+            symbols = self.symbols()
+            await websocket.send(json.dumps({"op": "subscribe", "symbols": symbols}))
+            resubscriber = asyncio.create_task(self._resubscribe(websocket, symbols))
+            try:
+                async for raw in websocket:
+                    message = json.loads(raw)
+                    symbol = message.get("symbol")
+                    if symbol and message.get("last") is not None:
+                        self.hub.publish(self.exchange_id, self.sandbox, symbol, message)
+            finally:
+                resubscriber.cancel()
+
+    async def _resubscribe(self, websocket, subscribed):
+        """Send the hub's symbols again whenever bots on this exchange add or drop some"""
+        while True:
+            await asyncio.sleep(self.reconnect_delay)
+            symbols = self.symbols()
+            if set(symbols) != set(subscribed):
+                subscribed = symbols
+                await websocket.send(json.dumps({"op": "subscribe", "symbols": symbols}))
+
+
+def create_price_feed(mode: str, hub, exchange_id: str, sandbox: bool,
+                      replay_url: Optional[str] = None) -> Optional[PriceFeed]:
+    """Build the feed for a PRICE_FEED_MODE value, None when polling only"""
+    if mode == "stream":
+        return ExchangeStreamFeed(hub, exchange_id, sandbox)
+    if mode == "replay":
+        return ReplayFeed(hub, exchange_id, sandbox, replay_url)
+    return None
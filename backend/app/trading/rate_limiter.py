@@ -0,0 +1,187 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Lower value is served first
+PRIORITY_CLOSE = 0
+PRIORITY_ORDER = 1
+PRIORITY_READ = 2
+
+# ccxt methods that place orders; everything else private is a read
+ORDER_METHODS = {
+    'create_order', 'create_market_order', 'create_limit_order',
+    'cancel_order', 'cancel_all_orders', 'edit_order',
+}
+# Account configuration calls gate the next order, so they go with orders
+CONFIG_METHODS = {'set_leverage', 'set_margin_mode', 'set_position_mode'}
+
+
+def call_priority(method: str, params: Optional[dict] = None) -> Optional[int]:
+    """Scheduling priority of a ccxt method, None for calls that are not scheduled"""
+    if method in ORDER_METHODS:
+        if params and params.get('reduceOnly'):
+            return PRIORITY_CLOSE
+        return PRIORITY_ORDER
+    if method in CONFIG_METHODS:
+        return PRIORITY_ORDER
+    if method.startswith('fetch_'):
+        return PRIORITY_READ
+    return None
+
+
+class TokenBucket:
+    """Request budget of one API key.
+
+    Tokens refill continuously at calls_per_minute / 60 per second up to a
+    burst of `burst` tokens. When the bucket is empty callers queue by
+    priority, so closes and orders go ahead of queued reads.
+    """
+
+    def __init__(self, calls_per_minute: float, burst: Optional[float] = None):
+        self.rate = 1.0
+        self.capacity = 1.0
+        self.tokens = 0.0
+        self.set_rate(calls_per_minute, burst)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._drain_task: Optional[asyncio.Task] = None
+
+    def set_rate(self, calls_per_minute: float, burst: Optional[float] = None):
+        self.rate = max(calls_per_minute, 1) / 60.0
+        # Default burst: a few seconds of budget, at least one call
+        self.capacity = max(1.0, burst if burst is not None else self.rate * settings.RATE_LIMIT_BURST_SECONDS)
+        self.tokens = min(self.tokens, self.capacity)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def backlog(self) -> float:
+        """Seconds until everything queued now would be served"""
+        self._refill()
+        return max(0.0, self.queued + 1 - self.tokens) / self.rate if self.queued else 0.0
+
+    async def acquire(self, priority: int = PRIORITY_READ):
+        self._refill()
+        if not self._waiters and self.tokens >= 1:
+            self.tokens -= 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        if self._drain_task is None or self._drain_task.done():
+            self._drain_task = asyncio.create_task(self._drain())
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Token was granted as we were cancelled, give it back
+                self.tokens = min(self.capacity, self.tokens + 1)
+            raise
+
+    async def _drain(self):
+        """Hand out tokens to queued callers in priority order as they refill"""
+        while self._waiters:
+            self._refill()
+            while self._waiters and self.tokens >= 1:
+                _, _, future = heapq.heappop(self._waiters)
+                if future.cancelled():
+                    continue
+                self.tokens -= 1
+                future.set_result(None)
+            if self._waiters:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class RequestScheduler:
+    """Token buckets per API key shared by every bot and endpoint using it.
+
+    The rate comes from the user's SubscriptionTier.api_calls_per_minute.
+    Bots read `stretch_factor` to slow their polling while a key is backlogged
+    instead of letting reads crowd out orders.
+    """
+
+    def __init__(self, default_calls_per_minute: Optional[int] = None):
+        self.default_calls_per_minute = (
+            default_calls_per_minute if default_calls_per_minute is not None
+            else settings.RATE_LIMIT_DEFAULT_CALLS_PER_MINUTE
+        )
+        self.buckets: Dict[str, TokenBucket] = {}
+
+    def bucket(self, key: str, calls_per_minute: Optional[int] = None) -> TokenBucket:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(calls_per_minute or self.default_calls_per_minute)
+            self.buckets[key] = bucket
+        elif calls_per_minute and abs(bucket.rate * 60 - calls_per_minute) > 1e-9:
+            bucket.set_rate(calls_per_minute)
+        return bucket
+
+    async def acquire(self, key: str, priority: int = PRIORITY_READ):
+        await self.bucket(key).acquire(priority)
+
+    def stretch_factor(self, key: str, interval: float) -> float:
+        """How much a poll interval should be stretched for the key's current backlog"""
+        bucket = self.buckets.get(key)
+        if bucket is None or interval <= 0:
+            return 1.0
+        factor = 1.0 + bucket.backlog() / interval
+        return min(factor, settings.RATE_LIMIT_MAX_POLL_STRETCH)
+
+    def forget(self, key: str):
+        self.buckets.pop(key, None)
+
+    def clear(self):
+        self.buckets.clear()
+
+
+class ScheduledExchange:
+    """ccxt client wrapper that routes private calls through a RequestScheduler.
+
+    Attribute access is passed through to the wrapped client, so callers use
+    it exactly like the client itself.
+    """
+
+    def __init__(self, client, scheduler: RequestScheduler, key: str):
+        self._client = client
+        self._scheduler = scheduler
+        self._key = key
+
+    @property
+    def client(self):
+        return self._client
+
+    @property
+    def rate_key(self) -> str:
+        return self._key
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr) or call_priority(name) is None:
+            return attr
+
+        async def scheduled(*args, **kwargs):
+            params = kwargs.get('params')
+            if params is None and args and isinstance(args[-1], dict):
+                params = args[-1]
+            await self._scheduler.acquire(self._key, call_priority(name, params))
+            return await attr(*args, **kwargs)
+
+        return scheduled
+
+
+request_scheduler = RequestScheduler()
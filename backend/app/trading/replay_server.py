@@ -0,0 +1,114 @@
+"""
+Local ticker replay server for testing streaming bots offline.
+
+Reads recorded ticks from a CSV file (columns: timestamp, symbol, last and
+optionally bid, ask; timestamp in milliseconds) and pushes them to every
+connected client as JSON messages, preserving the recorded spacing scaled
+by --speed.
+
+    python -m app.trading.replay_server ticks.csv --port 8765 --speed 10
+
+Point bots at it with PRICE_FEED_MODE=replay and
+PRICE_FEED_REPLAY_URL=ws://localhost:8765.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+from typing import List
+
+import websockets
+
+logger = logging.getLogger(__name__)
+
+
+def load_ticks(path: str) -> List[dict]:
+    """Load recorded ticks sorted by timestamp"""
+    ticks = []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            tick = {
+                "symbol": row["symbol"],
+                "timestamp": int(float(row["timestamp"])),
+                "last": float(row["last"]),
+            }
+            for field in ("bid", "ask"):
+                if row.get(field):
+                    tick[field] = float(row[field])
+            ticks.append(tick)
+    ticks.sort(key=lambda t: t["timestamp"])
+    return ticks
+
+
+class ReplayServer:
+    """Streams a recorded tick tape to WebSocket clients"""
+
+    def __init__(self, ticks: List[dict], speed: float = 1.0, loop: bool = False):
+        self.ticks = ticks
+        self.speed = speed
+        self.loop = loop
+
+    @staticmethod
+    def _apply_subscription(raw, subscription: dict):
+        """Restrict the replay to the symbols of a subscribe message (all when it lists none)"""
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            return
+        if isinstance(message, dict) and message.get("op") == "subscribe":
+            subscription["symbols"] = set(message["symbols"]) if message.get("symbols") else None
+
+    async def handler(self, websocket):
+        subscription = {"symbols": None}
+
+        # Optional subscribe message restricts the replay to some symbols
+        try:
+            self._apply_subscription(await asyncio.wait_for(websocket.recv(), timeout=1.0), subscription)
+        except asyncio.TimeoutError:
+            pass
+
+        async def read_subscriptions():
+            # Later subscribe messages replace the symbol set as bots add or drop symbols
+            async for raw in websocket:
+                self._apply_subscription(raw, subscription)
+
+        reader = asyncio.create_task(read_subscriptions())
+        try:
+            while True:
+                previous_ts = None
+                for tick in self.ticks:
+                    symbols = subscription["symbols"]
+                    if symbols and tick["symbol"] not in symbols:
+                        continue
+                    if previous_ts is not None and self.speed > 0:
+                        await asyncio.sleep(max(0, tick["timestamp"] - previous_ts) / 1000 / self.speed)
+                    previous_ts = tick["timestamp"]
+                    await websocket.send(json.dumps(tick))
+                if not self.loop:
+                    break
+        finally:
+            reader.cancel()
+
+    async def serve(self, host: str, port: int):
+        async with websockets.serve(self.handler, host, port):
+            logger.info(f"Replaying {len(self.ticks)} ticks on ws://{host}:{port}")
+            await asyncio.Future()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded ticks over WebSocket")
+    parser.add_argument("path", help="CSV file with timestamp,symbol,last[,bid,ask]")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed multiplier, 0 for no delay")
+    parser.add_argument("--loop", action="store_true", help="Restart the tape when it ends")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = ReplayServer(load_ticks(args.path), speed=args.speed, loop=args.loop)
+    asyncio.run(server.serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+from array import array
+from typing import List, Optional
+
+
+class LevelLadder:
+    """Martingale levels of one position stored in parallel float arrays"""
+
+    __slots__ = ("prices", "margins", "contracts")
+
+    def __init__(self):
+        self.prices = array('d')
+        self.margins = array('d')
+        self.contracts = array('d')
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def append(self, price: float, margin: float, contracts: float):
+        self.prices.append(price)
+        self.margins.append(margin)
+        self.contracts.append(contracts)
+
+    def clear(self):
+        del self.prices[:]
+        del self.margins[:]
+        del self.contracts[:]
+
+    def to_list(self) -> List[dict]:
+        """Levels in the dict form stored in BotPosition.position_levels"""
+        return [
+            {'price': price, 'margin': margin, 'contracts': contracts, 'level': i + 1}
+            for i, (price, margin, contracts) in enumerate(zip(self.prices, self.margins, self.contracts))
+        ]
+
+
+class SymbolState:
+    """Live martingale state of one symbol in a running bot"""
+
+    __slots__ = (
+        "current_step",
+        "entry_price",
+        "position_side",
+        "is_active",
+        "trade_in_progress",
+        "levels",
+        "trigger_prices",
+        "total_contracts",
+        "total_cost",
+        "realized_pnl",
+    )
+
+    def __init__(self):
+        self.current_step = 0
+        self.entry_price: Optional[float] = None
+        self.position_side: Optional[str] = None
+        self.is_active = False
+        self.trade_in_progress = False
+        self.levels = LevelLadder()
+        self.trigger_prices = array('d')
+        # Running totals over levels
+        self.total_contracts = 0.0
+        self.total_cost = 0.0
+        # Accumulates across cycles, not cleared by reset
+        self.realized_pnl = 0.0
+
+    def open(self, side: str, price: float, margin: float, contracts: float):
+        """Record the first fill of a new cycle"""
+        self.reset()
+        self.entry_price = price
+        self.position_side = side
+        self.is_active = True
+        self.add_level(price, margin, contracts)
+
+    def add_level(self, price: float, margin: float, contracts: float):
+        self.levels.append(price, margin, contracts)
+        self.total_contracts += contracts
+        self.total_cost += price * contracts
+
+    def reset(self):
+        self.current_step = 0
+        self.entry_price = None
+        self.position_side = None
+        self.is_active = False
+        self.levels.clear()
+        del self.trigger_prices[:]
+        self.total_contracts = 0.0
+        self.total_cost = 0.0
+
+    def weighted_average_entry(self) -> Optional[float]:
+        if self.total_contracts > 0:
+            return self.total_cost / self.total_contracts
+        return self.entry_price
+
+    def unrealized_pnl(self, price: float) -> float:
+        return price * self.total_contracts - self.total_cost
+
+    def reference_price(self) -> Optional[float]:
+        """Price the next martingale trigger is measured from"""
+        if self.current_step > 0 and self.trigger_prices:
+            return self.trigger_prices[-1]
+        return self.entry_price
+
+    def restore(self, row: dict):
+        """Rebuild state from a persisted BotPosition row"""
+        self.reset()
+        self.realized_pnl = row.get('realized_pnl') or 0.0
+        if not row.get('is_active'):
+            return
+        self.entry_price = row.get('entry_price')
+        self.position_side = row.get('side')
+        self.is_active = True
+        for level in row.get('position_levels') or []:
+            self.add_level(level['price'], level['margin'], level['contracts'])
+        self.trigger_prices.extend(row.get('martingale_trigger_prices') or [])
+        self.current_step = row.get('current_step') or 0
+
+    def snapshot(self) -> dict:
+        """Detached copy for the API and persistence"""
+        return {
+            'current_step': self.current_step,
+            'entry_price': self.entry_price,
+            'position_side': self.position_side,
+            'is_active': self.is_active,
+            'trade_in_progress': self.trade_in_progress,
+            'position_levels': self.levels.to_list(),
+            'martingale_trigger_prices': list(self.trigger_prices),
+            'total_contracts': self.total_contracts,
+            'weighted_average_entry': self.weighted_average_entry(),
+        }
@@ -0,0 +1,71 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.trading.backtest import BacktestParams, run_backtest
+from app.trading.bot_engine import TradingBot
+from app.trading.markets import MarketInfo, market_metadata
+
+
+def frame(rows):
+    """Candles from (open, high, low, close) tuples"""
+    return pd.DataFrame(rows, columns=["open", "high", "low", "close"])
+
+
+# Opens at 100, gaps up to 100.56 (the 0.56% take-profit) on the next candle
+TAKE_PROFIT = frame([(100.0, 100.0, 100.0, 100.0), (100.56, 100.56, 100.56, 100.56)])
+
+
+def test_take_profit_closes_the_cycle():
+    result = run_backtest(TAKE_PROFIT, BacktestParams(fee_rate=0.0))
+
+    assert result.cycles == 1
+    assert result.level_counts[0] == 1
+    assert result.deepest_level == 1
+    # 0.2 margin at 25x is 0.05 at 100; the new cycle opens at the last close
+    assert result.total_pnl == pytest.approx(0.05 * 0.56)
+    assert result.open_position
+    assert not result.liquidated
+
+
+def test_one_candle_fills_every_trigger_it_crosses():
+    candles = frame([(100.0, 100.0, 100.0, 100.0), (100.0, 100.0, 96.5, 97.0)])
+    result = run_backtest(candles, BacktestParams(fee_rate=0.0, initial_balance=1000.0))
+
+    # Triggers at 98.9, 97.81 and 96.74 fill; 95.67 is below the low
+    assert result.deepest_level == 4
+    assert result.cycles == 0
+    assert result.open_position
+    fills = 100.0 * 0.989 ** np.arange(4)
+    amounts = np.round(np.array([0.20, 0.27, 0.36, 0.47]) * 25 / fills, 4)
+    expected = float(np.sum(amounts * (96.5 - fills)))
+    assert result.total_pnl == pytest.approx(expected)
+
+
+def test_liquidation_stops_the_replay():
+    close = np.linspace(100.0, 40.0, 5000)
+    candles = frame(np.column_stack([np.r_[100.0, close[:-1]], np.r_[100.0, close[:-1]], close, close]))
+    result = run_backtest(candles, BacktestParams(fee_rate=0.0))
+
+    assert result.liquidated
+    assert not result.open_position
+    assert result.total_return_pct == pytest.approx(-100.0)
+    assert result.max_drawdown_pct == pytest.approx(100.0)
+
+
+def test_orders_are_sized_like_the_bot(monkeypatch):
+    # One whole contract minimum, far above the 0.05 a 0.2 margin buys
+    market = MarketInfo("X/USDT:USDT", amount_step=1.0, min_amount=1.0)
+    monkeypatch.setitem(market_metadata.info, ("bitget", False), {market.symbol: market})
+    bot = SimpleNamespace(
+        bot=SimpleNamespace(exchange="bitget"),
+        sandbox=False,
+        config=SimpleNamespace(martingale_sequence=[0.2, 0.27], leverage=25),
+    )
+    amount = TradingBot.calculate_position_size(bot, 0, 100.0, market.symbol)
+    assert amount == 1.0
+
+    result = run_backtest(TAKE_PROFIT, BacktestParams(fee_rate=0.0), market=market)
+    assert result.total_pnl == pytest.approx(amount * 0.56)
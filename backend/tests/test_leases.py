@@ -0,0 +1,200 @@
+from types import SimpleNamespace
+
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.core.pubsub import InMemoryBroker, InMemoryPubSub
+from app.services.bot_supervisor import BotSupervisor
+from app.models import BotStatus
+from app.services.leases import InMemoryLeaseStore, LeaseStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeCheckpointer:
+    async def preload(self, bot_ids):
+        list(bot_ids)
+
+
+class FakeManager:
+    """Stands in for BotManager: tracks which bots run on one worker"""
+
+    def __init__(self):
+        self.running_bots = {}
+        self.checkpointer = FakeCheckpointer()
+        # Bots whose stop this worker broadcast
+        self.announced = []
+
+    def is_bot_running(self, bot_id):
+        return bot_id in self.running_bots
+
+    async def detach_bot(self, bot_id):
+        return self.running_bots.pop(bot_id, None) is not None
+
+    async def detach_stopped_bot(self, bot_id):
+        if not await self.detach_bot(bot_id):
+            return False
+        self.announced.append(bot_id)
+        return True
+
+    async def stop_bot(self, db, bot):
+        await self.detach_bot(str(bot.uuid))
+        return True
+
+
+def make_worker(store, worker_id, bots, transport=None):
+    """A supervisor whose RUNNING bots are `bots`; any other bot counts as STOPPED"""
+    manager = FakeManager()
+    supervisor = BotSupervisor(manager, store, worker_id, session_factory=object(),
+                               lease_ttl=30.0, heartbeat_interval=10.0, transport=transport)
+
+    async def load_running_bots():
+        return dict(bots)
+
+    async def load_statuses(bot_ids):
+        return {bot_id: BotStatus.RUNNING if bot_id in bots else BotStatus.STOPPED for bot_id in bot_ids}
+
+    async def start_local(bot):
+        manager.running_bots[str(bot.uuid)] = bot
+        return True
+
+    supervisor._load_running_bots = load_running_bots
+    supervisor._load_statuses = load_statuses
+    supervisor._start_local = start_local
+    return supervisor, manager
+
+
+@pytest.fixture
+def bots():
+    return {f"bot-{i}": SimpleNamespace(uuid=f"bot-{i}", id=i) for i in range(4)}
+
+
+@pytest.fixture(autouse=True)
+def no_stagger(monkeypatch):
+    monkeypatch.setattr(settings, "BOT_RESUME_STAGGER", 0.0)
+
+
+def test_lease_store_is_abstract():
+    with pytest.raises(TypeError):
+        LeaseStore()
+
+
+@pytest.mark.asyncio
+async def test_lease_is_exclusive_until_it_expires():
+    clock = FakeClock()
+    store = InMemoryLeaseStore(clock)
+
+    assert await store.acquire("bot", "a", ttl=30)
+    assert not await store.acquire("bot", "b", ttl=30)
+    assert await store.renew(["bot"], "b", ttl=30) == set()
+
+    clock.now += 31
+    assert await store.owner("bot") is None
+    assert await store.acquire("bot", "b", ttl=30)
+    assert await store.renew(["bot"], "a", ttl=30) == set()
+    assert await store.owner("bot") == "b"
+
+
+@pytest.mark.asyncio
+async def test_release_only_by_owner():
+    store = InMemoryLeaseStore(FakeClock())
+    await store.acquire("bot", "a", ttl=30)
+
+    await store.release("bot", "b")
+    assert await store.owner("bot") == "a"
+    await store.release("bot", "a")
+    assert await store.owner("bot") is None
+
+
+@pytest.mark.asyncio
+async def test_workers_share_bots_and_take_over_a_dead_worker(bots):
+    clock = FakeClock()
+    store = InMemoryLeaseStore(clock)
+    worker_a, manager_a = make_worker(store, "a", bots)
+    worker_b, manager_b = make_worker(store, "b", bots)
+
+    # Alone, the first worker takes every bot
+    assert await worker_a.reconcile() == 4
+    assert await worker_b.reconcile() == 0
+
+    # The busier worker hands one bot per heartbeat to the idle one
+    for _ in range(2):
+        await worker_a.reconcile()
+        await worker_b.reconcile()
+    assert len(manager_a.running_bots) == 2
+    assert len(manager_b.running_bots) == 2
+    assert not manager_a.running_bots.keys() & manager_b.running_bots.keys()
+
+    # Worker a stops heartbeating; once its leases expire b runs everything
+    for _ in range(3):
+        clock.now += 11
+        started = await worker_b.reconcile()
+    assert started == 2
+    assert set(manager_b.running_bots) == set(bots)
+
+    # When a comes back it drops the bots it lost instead of running them twice
+    await worker_a.reconcile()
+    assert manager_a.running_bots == {}
+
+
+@pytest.mark.asyncio
+async def test_stopped_bot_is_dropped_by_its_worker(bots):
+    store = InMemoryLeaseStore(FakeClock())
+    worker, manager = make_worker(store, "a", bots)
+    await worker.reconcile()
+
+    del bots["bot-0"]
+    await worker.reconcile()
+    assert "bot-0" not in manager.running_bots
+    assert manager.announced == ["bot-0"]
+    assert await store.owner("bot-0") is None
+
+
+@pytest.mark.asyncio
+async def test_owner_drops_a_bot_stopped_elsewhere_without_waiting_for_a_heartbeat(bots):
+    store = InMemoryLeaseStore(FakeClock())
+    broker = InMemoryBroker()
+    owner, owner_manager = make_worker(store, "a", bots, InMemoryPubSub(broker))
+    other, _ = make_worker(store, "b", bots, InMemoryPubSub(broker))
+    await owner.reconcile()
+    listener = asyncio.create_task(owner._listen())
+    await asyncio.sleep(0)
+
+    bot = bots.pop("bot-0")
+    assert await other.stop_bot(None, bot)
+    for _ in range(100):
+        if owner_manager.announced:
+            break
+        await asyncio.sleep(0.01)
+
+    listener.cancel()
+    await asyncio.gather(listener, return_exceptions=True)
+    assert owner_manager.announced == ["bot-0"]
+    assert "bot-0" not in owner_manager.running_bots
+    assert await store.owner("bot-0") is None
+
+
+@pytest.mark.asyncio
+async def test_failed_start_keeps_the_lease_of_a_bot_running_here(bots):
+    store = InMemoryLeaseStore(FakeClock())
+    worker, manager = make_worker(store, "a", bots)
+    await worker.reconcile()
+
+    async def start_local(bot):
+        return False
+
+    worker._start_local = start_local
+    assert await worker._start_acquired({"bot-0": bots["bot-0"]}) == 0
+    assert await store.owner("bot-0") == "a"
+
+    del manager.running_bots["bot-1"]
+    assert await worker._start_acquired({"bot-1": bots["bot-1"]}) == 0
+    assert await store.owner("bot-1") is None
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from app.trading import optimizer
+from app.trading.optimizer import evaluate, parameter_grid
+
+
+def candles(close: np.ndarray, wick: float = 0.0005) -> np.ndarray:
+    """ccxt-style OHLCV rows around a close series"""
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * (1 + wick)
+    low = np.minimum(open_, close) * (1 - wick)
+    return np.column_stack([np.arange(len(close)), open_, high, low, close, np.zeros(len(close))])
+
+
+@pytest.fixture
+def crash():
+    """One symbol falling from 100 to 40"""
+    optimizer._init_worker({"CRASH": candles(np.linspace(100.0, 40.0, 5000))})
+
+
+@pytest.fixture
+def random_walks():
+    rng = np.random.default_rng(7)
+    optimizer._init_worker({
+        symbol: candles(100 * np.exp(np.cumsum(rng.normal(0, 0.0006, 50000))))
+        for symbol in ("A", "B")
+    })
+
+
+def test_liquidation_without_pruning_is_reported_not_pruned(crash):
+    config = parameter_grid(max_positions=(1,))[0]
+    row = evaluate(config, ["CRASH"], 0.0006, None, None)
+
+    assert row["liquidated"]
+    assert not row["pruned"]
+    assert row["total_return_pct"] == pytest.approx(-100.0)
+
+
+def test_drawdown_threshold_prunes(crash):
+    config = parameter_grid(leverage=(5,), max_positions=(1,))[0]
+    row = evaluate(config, ["CRASH"], 0.0006, 100.0, 20)
+
+    assert row["pruned"]
+    assert not row["liquidated"]
+
+
+def test_unpruned_configs_stay_within_the_threshold(random_walks):
+    grid = parameter_grid(leverage=(10, 25), take_profit_pct=(0.4, 0.8),
+                          martingale_trigger_pct=(0.8, 1.5), max_positions=(1, 2))
+    pruned = 0
+    for config in grid:
+        row = evaluate(config, ["A", "B"], 0.0006, 60.0, 20)
+        if row["pruned"]:
+            pruned += 1
+            continue
+        assert row["max_drawdown_pct"] <= 20
+        # Without a threshold the same config replays identically
+        full = evaluate(config, ["A", "B"], 0.0006, 60.0, None)
+        assert full["total_pnl"] == pytest.approx(row["total_pnl"])
+    assert 0 < pruned < len(grid)
@@ -0,0 +1,138 @@
+import asyncio
+import json
+
+import pytest
+import pytest_asyncio
+
+from app.core.pubsub import InMemoryBroker, InMemoryPubSub, PubSubBackend
+from app.core.websocket import ConnectionManager
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.scope = {}
+        self.sent = []
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+    async def close(self, code=1000):
+        pass
+
+
+async def wait_until(condition, timeout=1.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+@pytest_asyncio.fixture
+async def workers():
+    """Two connection managers acting as separate API workers on one broker"""
+    broker = InMemoryBroker()
+    managers = [
+        ConnectionManager(coalesce_window=0.05, transport=InMemoryPubSub(broker))
+        for _ in range(2)
+    ]
+    for manager in managers:
+        manager.start()
+    yield managers
+    for manager in managers:
+        await manager.disconnect_all()
+        await manager.stop()
+
+
+def test_backend_is_abstract():
+    with pytest.raises(TypeError):
+        PubSubBackend()
+
+
+@pytest.mark.asyncio
+async def test_broker_delivers_only_to_subscribed_backends():
+    broker = InMemoryBroker()
+    publisher, subscriber = InMemoryPubSub(broker), InMemoryPubSub(broker)
+    await subscriber.subscribe("updates")
+
+    await publisher.publish("updates", "hello")
+    await publisher.publish("elsewhere", "ignored")
+
+    messages = subscriber.listen()
+    assert await asyncio.wait_for(messages.__anext__(), timeout=1.0) == ("updates", "hello")
+    await messages.aclose()
+    assert subscriber.inbox.empty()
+    assert publisher.inbox.empty()
+
+
+@pytest.mark.asyncio
+async def test_update_reaches_user_connected_to_another_worker(workers):
+    worker_a, worker_b = workers
+    websocket = FakeWebSocket()
+    await worker_b.connect(websocket, "user-1")
+
+    await worker_a.broadcast_bot_update("user-1", "bot-1", "started", {"status": "running"})
+    await wait_until(lambda: websocket.sent)
+
+    message = websocket.sent[0]
+    assert message["type"] == "bot_update"
+    assert message["bot_id"] == "bot-1"
+    assert message["update_type"] == "started"
+
+
+@pytest.mark.asyncio
+async def test_ticks_are_coalesced_across_workers(workers):
+    worker_a, worker_b = workers
+    websocket = FakeWebSocket()
+    await worker_b.connect(websocket, "user-1")
+
+    for price in (1.0, 2.0, 3.0):
+        await worker_a.broadcast_bot_update("user-1", "bot-1", "position_update", {"symbol": "BTC", "price": price})
+    await wait_until(lambda: websocket.sent)
+    await asyncio.sleep(0.1)
+
+    assert [message["data"]["price"] for message in websocket.sent] == [3.0]
+
+
+@pytest.mark.asyncio
+async def test_worker_unsubscribes_after_last_socket_leaves(workers):
+    _, worker_b = workers
+    first, second = FakeWebSocket(), FakeWebSocket()
+    await worker_b.connect(first, "user-1")
+    await worker_b.connect(second, "user-1")
+    channel = worker_b.channel("user-1")
+    assert channel in worker_b.transport.channels
+
+    worker_b.disconnect(first, "user-1")
+    await asyncio.sleep(0.05)
+    assert channel in worker_b.transport.channels
+
+    worker_b.disconnect(second, "user-1")
+    await wait_until(lambda: channel not in worker_b.transport.channels)
+
+
+@pytest.mark.asyncio
+async def test_full_outbox_drops_ticks_before_events():
+    manager = ConnectionManager(coalesce_window=0, transport=InMemoryPubSub())
+    manager.max_outbox = 2
+
+    manager.publish({"type": "bot_update", "update_type": "position_update"}, "user-1")
+    manager.publish({"type": "bot_update", "update_type": "trade_opened"}, "user-1")
+    manager.publish({"type": "bot_update", "update_type": "stopped"}, "user-1")
+    manager.publish({"type": "bot_update", "update_type": "position_update"}, "user-1")
+
+    queued = [json.loads(payload)["update_type"] for _, payload, _ in manager._outbox]
+    assert queued == ["trade_opened", "stopped"]
+    assert manager.dropped_ticks == 2
+    assert manager.dropped_events == 0
+
+    manager.publish({"type": "bot_update", "update_type": "position_closed"}, "user-1")
+    queued = [json.loads(payload)["update_type"] for _, payload, _ in manager._outbox]
+    assert queued == ["stopped", "position_closed"]
+    assert manager.dropped_events == 1
+    await manager.stop()
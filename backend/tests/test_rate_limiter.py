@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.trading import rate_limiter
+from app.trading.rate_limiter import (
+    PRIORITY_CLOSE,
+    PRIORITY_ORDER,
+    PRIORITY_READ,
+    RequestScheduler,
+    ScheduledExchange,
+    TokenBucket,
+    call_priority,
+)
+
+
+class FakeClient:
+    """Records the order in which calls reach the exchange"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def fetch_balance(self, params=None):
+        self.calls.append("fetch_balance")
+
+    async def fetch_ticker(self, symbol, params=None):
+        self.calls.append("fetch_ticker")
+
+    async def create_order(self, symbol, type, side, amount, price=None, params=None):
+        self.calls.append("close" if params and params.get("reduceOnly") else "order")
+
+    def market(self, symbol):
+        return symbol
+
+
+def test_call_priorities():
+    assert call_priority("create_order", {"reduceOnly": True}) == PRIORITY_CLOSE
+    assert call_priority("create_order") == PRIORITY_ORDER
+    assert call_priority("set_leverage") == PRIORITY_ORDER
+    assert call_priority("fetch_positions") == PRIORITY_READ
+    assert call_priority("market") is None
+
+
+@pytest.mark.asyncio
+async def test_queued_closes_and_orders_go_before_queued_reads():
+    scheduler = RequestScheduler()
+    scheduler.buckets["key"] = TokenBucket(600, burst=1)
+    client = FakeClient()
+    exchange = ScheduledExchange(client, scheduler, "key")
+    assert exchange.market("BTC/USDT") == "BTC/USDT"
+
+    # Spend the burst so every call below has to queue
+    await scheduler.acquire("key")
+    await asyncio.gather(
+        exchange.fetch_balance(),
+        exchange.fetch_ticker("BTC/USDT"),
+        exchange.create_order("BTC/USDT", "market", "buy", 1.0),
+        exchange.create_order("BTC/USDT", "market", "sell", 1.0, None, {"reduceOnly": True}),
+    )
+
+    assert client.calls == ["close", "order", "fetch_balance", "fetch_ticker"]
+
+
+def test_tokens_refill_at_the_tier_rate(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limiter.time, "monotonic", lambda: now[0])
+    bucket = TokenBucket(120, burst=4)
+    bucket.tokens = 0.0
+
+    now[0] += 1.0
+    bucket._refill()
+    assert bucket.tokens == pytest.approx(2.0)
+
+    now[0] += 10.0
+    bucket._refill()
+    assert bucket.tokens == pytest.approx(4.0)
+
+
+@pytest.mark.asyncio
+async def test_backlog_stretches_polling():
+    scheduler = RequestScheduler()
+    bucket = scheduler.bucket("key", calls_per_minute=600)
+    bucket.tokens = 0.0
+    assert scheduler.stretch_factor("other", 0.5) == 1.0
+
+    waiters = [asyncio.create_task(scheduler.acquire("key")) for _ in range(5)]
+    await asyncio.sleep(0)
+    # Five queued calls and the next one at ten per second: 0.6s of backlog
+    assert scheduler.stretch_factor("key", 0.5) == pytest.approx(2.2, abs=0.05)
+    assert scheduler.stretch_factor("key", 0.01) == settings.RATE_LIMIT_MAX_POLL_STRETCH
+
+    await asyncio.gather(*waiters)
+    assert scheduler.stretch_factor("key", 0.5) == 1.0
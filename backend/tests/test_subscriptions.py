@@ -0,0 +1,118 @@
+import json
+
+import pytest
+import pytest_asyncio
+
+from app.core.websocket import (
+    BOT_CREATED,
+    EVENT_FILLS,
+    EVENT_LIFECYCLE,
+    EVENT_TICKS,
+    LIFECYCLE_EVENTS,
+    ClientConnection,
+    ConnectionManager,
+    SubscriptionIndex,
+    event_class,
+)
+from test_pubsub import FakeWebSocket, wait_until
+
+
+def client(name):
+    return ClientConnection(FakeWebSocket(), name, max_queue=16, overflow="drop_oldest")
+
+
+@pytest_asyncio.fixture
+async def manager():
+    manager = ConnectionManager(coalesce_window=0, transport=None, pubsub_backend="local")
+    yield manager
+    await manager.disconnect_all()
+    await manager.stop()
+
+
+def test_event_classes():
+    for update_type in LIFECYCLE_EVENTS:
+        assert event_class(update_type) == EVENT_LIFECYCLE
+    assert event_class(BOT_CREATED) == EVENT_LIFECYCLE
+    assert event_class("position_closed") == EVENT_FILLS
+    assert event_class("position_update") == EVENT_TICKS
+
+
+def test_unfiltered_sockets_get_everything():
+    index = SubscriptionIndex()
+    a, b = client("a"), client("b")
+    index.add(a)
+    index.add(b)
+
+    assert not index.is_filtered()
+    assert index.match("bot-1", "BTC/USDT", EVENT_TICKS) == {a, b}
+
+
+def test_routes_by_bot_symbol_and_event_class():
+    index = SubscriptionIndex()
+    by_bot, by_symbol, by_event, everything = client("bot"), client("symbol"), client("event"), client("all")
+    for connection in (by_bot, by_symbol, by_event, everything):
+        index.add(connection)
+    index.update(by_bot, "subscribe", "bots", ["bot-1"])
+    index.update(by_symbol, "subscribe", "symbols", ["ETH/USDT"])
+    index.update(by_event, "subscribe", "events", [EVENT_LIFECYCLE])
+
+    assert index.match("bot-1", "BTC/USDT", EVENT_TICKS) == {by_bot, everything}
+    assert index.match("bot-2", "ETH/USDT", EVENT_FILLS) == {by_symbol, everything}
+    # Lifecycle events carry no symbol and pass symbol filters
+    assert index.match("bot-2", None, EVENT_LIFECYCLE) == {by_symbol, by_event, everything}
+
+
+def test_filters_combine_across_dimensions():
+    index = SubscriptionIndex()
+    connection = client("a")
+    index.add(connection)
+    index.update(connection, "subscribe", "bots", ["bot-1"])
+    index.update(connection, "subscribe", "events", [EVENT_FILLS])
+
+    assert index.match("bot-1", "BTC/USDT", EVENT_FILLS) == {connection}
+    assert index.match("bot-1", "BTC/USDT", EVENT_TICKS) == set()
+    assert index.match("bot-2", "BTC/USDT", EVENT_FILLS) == set()
+
+
+def test_unsubscribe_and_remove():
+    index = SubscriptionIndex()
+    connection = client("a")
+    index.add(connection)
+    index.update(connection, "unsubscribe", "events", [EVENT_TICKS])
+    assert connection.filters["events"] == {EVENT_LIFECYCLE, EVENT_FILLS}
+    assert index.match("bot-1", "BTC/USDT", EVENT_TICKS) == set()
+
+    index.update(connection, "subscribe", "events", "*")
+    assert index.match("bot-1", "BTC/USDT", EVENT_TICKS) == {connection}
+
+    index.update(connection, "subscribe", "bots", ["bot-1"])
+    index.remove(connection)
+    assert not index.is_filtered()
+    assert index.index["bots"] == {}
+
+
+@pytest.mark.asyncio
+async def test_lifecycle_subscriber_gets_created_and_not_ticks(manager):
+    websocket = FakeWebSocket()
+    await manager.connect(websocket, "user-1")
+    manager.handle_command(websocket, json.dumps({"action": "subscribe", "events": [EVENT_LIFECYCLE]}))
+
+    await manager.broadcast_bot_update("user-1", "bot-1", "position_update", {"symbol": "BTC", "price": 1.0})
+    await manager.broadcast_bot_update("user-1", "bot-1", BOT_CREATED, {"name": "bot"})
+    await wait_until(lambda: len(websocket.sent) >= 2)
+
+    subscriptions, created = websocket.sent
+    assert subscriptions["type"] == "subscriptions"
+    assert subscriptions["events"] == [EVENT_LIFECYCLE]
+    assert created["update_type"] == BOT_CREATED
+
+
+@pytest.mark.asyncio
+async def test_malformed_command_gets_an_error(manager):
+    websocket = FakeWebSocket()
+    await manager.connect(websocket, "user-1")
+    manager.handle_command(websocket, json.dumps({"action": "subscribe", "events": ["trades"]}))
+
+    await wait_until(lambda: websocket.sent)
+    assert websocket.sent[0]["type"] == "error"
+    assert "trades" in websocket.sent[0]["error"]